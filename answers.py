@@ -0,0 +1,195 @@
+'''Answers to questions about a recipe step, prepared when it is parsed so
+the chatbot only has to look them up'''
+
+import re
+
+from quantity import parse_quantity, vulgar_fractions
+
+#############
+# VARIABLES #
+#############
+
+GOOGLE_SEARCH_URL = "https://www.google.com/search?q="
+YOUTUBE_SEARCH_URL = "https://www.youtube.com/results?search_query="
+
+_degrees_re = re.compile(
+    r'(?P<value>\d+(?:\.\d+)?)\s*(?:°|º|degrees?|deg\b\.?)\s*'
+    r'(?P<scale>[fc](?:ahrenheit|elsius)?\b)?', re.IGNORECASE)
+
+time_units = dict([
+    ('s', 1), ('sec', 1), ('secs', 1), ('second', 1), ('seconds', 1),
+    ('m', 60), ('min', 60), ('mins', 60), ('minute', 60), ('minutes', 60),
+    ('h', 3600), ('hr', 3600), ('hrs', 3600), ('hour', 3600),
+    ('hours', 3600),
+    ('d', 86400), ('day', 86400), ('days', 86400),
+    ('overnight', 12 * 3600),
+])
+'''Seconds in each unit of time'''
+
+time_words = dict([
+    ('a', 1), ('an', 1), ('one', 1), ('two', 2), ('three', 3), ('four', 4),
+    ('five', 5), ('six', 6), ('seven', 7), ('eight', 8), ('nine', 9),
+    ('ten', 10), ('fifteen', 15), ('twenty', 20), ('thirty', 30),
+    ('forty', 40), ('forty-five', 45), ('sixty', 60), ('half', 1 / 2),
+    ('half an', 1 / 2), ('a half', 1 / 2), ('a quarter', 1 / 4),
+])
+'''Values of numbers written as words'''
+
+def _longest_first(words) -> str:
+    return '|'.join(sorted(map(re.escape, words), key=len, reverse=True))
+
+_vulgar = ''.join(vulgar_fractions)
+
+_time_re = re.compile(
+    rf'''(?<!\w)(?P<value>(?:\d+\s+(?=\d+/|[{_vulgar}]))?[\d./{_vulgar}]+
+                     |{_longest_first(time_words)})
+       (?:\s*(?:-|–|to|or)\s*[\d./]+)?     # ranges count as the lower bound
+       \s*(?P<unit>{_longest_first(time_units)})\b
+     | \b(?P<alone>overnight)\b''',
+    re.IGNORECASE | re.VERBOSE)
+
+_word_re = re.compile(r'\w+')
+
+####################
+# HELPER FUNCTIONS #
+####################
+
+def generate_youtube_search_url(query: str) -> str:
+    return YOUTUBE_SEARCH_URL + query.replace(" ", "+")
+
+def generate_google_search_url(query: str) -> str:
+    return GOOGLE_SEARCH_URL + query.replace(" ", "+")
+
+def normalize_temperature(temp: str) -> str:
+    '''Writes temperatures in degrees compactly, e.g. 350 degrees F is
+    350°F'''
+    temp = ' '.join(temp.split())
+
+    def degrees(match: re.Match) -> str:
+        scale = match['scale'][0].upper() if match['scale'] else ''
+        return f"{match['value']}°{scale}"
+
+    return _degrees_re.sub(degrees, temp)
+
+def duration_seconds(time: str) -> int | None:
+    '''Converts a duration, e.g. 1 hour 30 minutes, to seconds, or None if
+    it has no unit of time'''
+    total = None
+    for match in _time_re.finditer(time):
+        if match['alone']:
+            seconds = time_units['overnight']
+        else:
+            value = time_words.get(match['value'].lower())
+            if value is None:
+                # Whole numbers and fractions, e.g. 1 1/2 or 1½, add up
+                value = parse_quantity(match['value'])
+            if not value:
+                continue
+            seconds = value * time_units[match['unit'].lower()]
+        total = (total or 0) + seconds
+    return None if total is None else int(total)
+
+def format_seconds(seconds: int) -> str:
+    '''Writes a number of seconds in hours, minutes and seconds'''
+    parts = []
+    for (unit, size) in (('hour', 3600), ('minute', 60), ('second', 1)):
+        count, seconds = divmod(seconds, size)
+        if count:
+            parts.append(f"{count} {unit}{'' if count == 1 else 's'}")
+    return ' '.join(parts) or '0 seconds'
+
+def name_words(text: str) -> tuple[str, ...]:
+    '''Splits text into the lowercase words that ingredient names are
+    matched by'''
+    return tuple(_word_re.findall(text.lower()))
+
+################
+# ANSWER CLASS #
+################
+
+class StepAnswers:
+    '''Prepared answers to questions about one step of a recipe'''
+
+    __slots__ = ('temps', 'temperature', 'seconds', 'duration',
+                 'amounts', 'amount', 'amount_names', 'longest_name',
+                 'what', 'how', 'how_method')
+
+    def __init__(self, step, title: str):
+        self.temps: list[str] = [normalize_temperature(temp)
+                                 for temp in step.temps]
+        '''Normalized temperatures of the step'''
+
+        method = ', '.join(step.methods) if step.methods else step.text
+        if self.temps:
+            self.temperature = f"Temperature : {', '.join(self.temps)}"
+        else:
+            query = f"At what temperature should I {method} when preparing {title}"
+            self.temperature = f"No temperature specified. For more details, visit: {generate_google_search_url(query)}"
+        '''Answer to questions about temperature'''
+
+        known = [seconds for seconds in map(duration_seconds, step.times)
+                 if seconds is not None]
+        self.seconds: int | None = sum(known) if known else None
+        '''Total of the step's times in seconds, if any of them has a unit'''
+        if step.times:
+            self.duration = f"Duration: {', '.join(step.times)}"
+            if len(known) > 1:
+                self.duration += f" ({format_seconds(self.seconds)} in all)"
+        else:
+            query = f"How long should I {method} when preparing {title}"
+            self.duration = f"No duration specified. For more details, visit: {generate_google_search_url(query)}"
+        '''Answer to questions about duration'''
+
+        self.amounts: list[str] = []
+        '''How much of each of the step's ingredients to use'''
+        self.amount_names: dict[tuple[str, ...], list[int]] = {}
+        '''Positions in amounts of the ingredients with each name'''
+        for (i, ingredient) in enumerate(step.ingredients):
+            quantity = ingredient.quantity if ingredient.quantity else "some"
+            unit = ingredient.unit if ingredient.unit else ""
+            self.amounts.append(f"Use {quantity} {unit} of {ingredient.name}.")
+            words = name_words(ingredient.name or '')
+            if words:
+                self.amount_names.setdefault(words, []).append(i)
+        self.amount: str = "\n".join(self.amounts)
+        '''Answer to questions about amounts that name no ingredient'''
+        self.longest_name: int = max(map(len, self.amount_names), default=0)
+        '''Number of words in the longest ingredient name'''
+
+        # Answers to "what is that?" and "how do I do that?"
+        what = []
+        how = []
+        for method in step.methods:
+            query = f"{method} as a method of cooking"
+            what.append(f"For more details about '{method}', visit: {generate_google_search_url(query)}")
+            query = f"how do I {method} in the context of cooking"
+            how.append(f"For more details about how to '{method}', visit: {generate_youtube_search_url(query)}")
+        for ingredient in step.ingredients:
+            if isinstance(ingredient.name, str):
+                what.append(f"For more details about '{ingredient.name}', visit: {generate_google_search_url(ingredient.name)}")
+        for tool in step.tools:
+            what.append(f"For more details about '{tool}', visit: {generate_google_search_url(tool)}")
+        self.what: str = "\n".join(what)
+        '''Links about each method, ingredient and tool of the step'''
+        self.how: str = "\n".join(how)
+        '''Video links about each method of the step'''
+
+        self.how_method: str | None = None
+        '''Video link about the step's first method, if it has one'''
+        if step.methods:
+            first = step.methods[0]
+            query = f"How do I {first} for the cooking"
+            self.how_method = f"{first}: Link-- {generate_youtube_search_url(query)}"
+
+    def amount_for(self, prompt: str) -> str:
+        '''Returns how much to use of the ingredients named in a prompt, or
+        of all the step's ingredients if it names none'''
+        words = name_words(prompt)
+        mentioned = set()
+        for n in range(1, min(self.longest_name, len(words)) + 1):
+            for start in range(len(words) - n + 1):
+                mentioned.update(self.amount_names.get(
+                    words[start:start + n], ()))
+        if not mentioned:
+            return self.amount
+        return "\n".join(self.amounts[i] for i in sorted(mentioned))
@@ -0,0 +1,119 @@
+'''Parses many recipes across all cores into a JSONL corpus.
+
+Inputs are either a file of recipe URLs (one per line) or a directory of
+saved recipe pages (*.html). Each output line holds the input, its timing,
+and either the parsed recipe (see Recipe.to_dict) or an error.
+
+Usage: python batch_parse.py INPUT [-o OUTPUT] [-j WORKERS] [--source NAME]
+'''
+
+import argparse
+import json
+import os
+import sys
+import time
+import util as u
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from fetcher import default_fetcher
+from parser import find_page_url, normalize_url, parse_recipe_html
+
+####################
+# WORKER FUNCTIONS #
+####################
+
+def init_batch_worker() -> None:
+    '''Prepares a worker process that fetches each page only once'''
+    u.load_models()
+    # Pages are not fetched again, so remembering them only takes memory
+    default_fetcher().max_cached_bytes = 0
+
+def parse_item(item: str, is_file: bool,
+               source: u.RecipeSource | None = None) -> dict:
+    '''Parses one URL or saved page into an output record'''
+    start = time.perf_counter()
+    record = {'input': item}
+    try:
+        if is_file:
+            with open(item, encoding='utf-8', errors='replace') as f:
+                html = f.read()
+            url = find_page_url(html)
+        else:
+            url = normalize_url(item)
+            html = None
+        record['url'] = url
+        if source is None:
+            source = u.RecipeSource.from_url(url or '')
+        if source == u.RecipeSource.UNKNOWN:
+            raise ValueError('unsupported recipe source')
+        if html is None:
+            html = default_fetcher().fetch(url)
+        record['recipe'] = parse_recipe_html(html, source).to_dict()
+        record['ok'] = True
+    except Exception as e:
+        record['ok'] = False
+        record['error'] = f'{type(e).__name__}: {e}'
+    record['seconds'] = time.perf_counter() - start
+    return record
+
+#################
+# API FUNCTIONS #
+#################
+
+def list_items(path: str) -> tuple[list[str], bool]:
+    '''Lists the URLs in a file, or the saved pages in a directory'''
+    if os.path.isdir(path):
+        return (sorted(os.path.join(path, name) for name in os.listdir(path)
+                       if name.endswith(('.html', '.htm'))), True)
+    with open(path, encoding='utf-8') as f:
+        return ([line.strip() for line in f
+                 if line.strip() and not line.startswith('#')], False)
+
+def batch_parse(items: list[str], is_file: bool, out,
+                workers: int | None = None,
+                source: u.RecipeSource | None = None) -> dict:
+    '''Parses items across a process pool, writing JSONL records to out as
+    they finish, and returns summary statistics'''
+    start = time.perf_counter()
+    ok = 0
+    with ProcessPoolExecutor(max_workers=workers,
+                             initializer=init_batch_worker) as executor:
+        futures = [executor.submit(parse_item, item, is_file, source)
+                   for item in items]
+        for future in as_completed(futures):
+            record = future.result()
+            ok += record['ok']
+            out.write(json.dumps(record, ensure_ascii=False))
+            out.write('\n')
+            out.flush()
+    elapsed = time.perf_counter() - start
+    return {'items': len(items), 'ok': ok, 'errors': len(items) - ok,
+            'seconds': elapsed,
+            'recipes_per_second': ok / elapsed if elapsed else 0.0}
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('input',
+                            help='file of URLs or directory of saved pages')
+    arg_parser.add_argument('-o', '--output', default='-',
+                            help='JSONL file to write (default: stdout)')
+    arg_parser.add_argument('-j', '--workers', type=int, default=None,
+                            help='number of worker processes '
+                                 '(default: number of cores)')
+    arg_parser.add_argument('--source', choices=[
+                                s.name.lower() for s in u.RecipeSource
+                                if s != u.RecipeSource.UNKNOWN],
+                            help='source of saved pages without a '
+                                 'canonical URL')
+    args = arg_parser.parse_args()
+
+    (items, is_file) = list_items(args.input)
+    source = u.RecipeSource[args.source.upper()] if args.source else None
+    if args.output == '-':
+        stats = batch_parse(items, is_file, sys.stdout, args.workers, source)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as out:
+            stats = batch_parse(items, is_file, out, args.workers, source)
+    print(f"Parsed {stats['ok']}/{stats['items']} recipes "
+          f"({stats['errors']} errors) in {stats['seconds']:.1f}s: "
+          f"{stats['recipes_per_second']:.2f} recipes/sec", file=sys.stderr)
@@ -0,0 +1,4 @@
+'''Benchmarks for recipe parsing and the chatbot.
+
+Run from the project directory, e.g. python -m benchmarks.startup
+'''
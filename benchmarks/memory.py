@@ -0,0 +1,146 @@
+'''Memory benchmark of parsed recipes held in memory.
+
+Loads a JSONL recipe corpus (as written by batch_parse.py) many times over
+and reports the bytes used per recipe by the current representation, next
+to the bytes used by the same recipes as the parser built them before this
+series: plain objects with a __dict__ each, no interned units or methods,
+and one ingredient state per recipe, deep-copied from its ingredients and
+shared by every step. Both are measured, by walking the objects each
+recipe keeps alive. The current figure includes the answers precomputed for
+each step, which did not exist before, so their share is reported too.
+
+The default corpus is synthetic: three recipes written by hand in the
+batch_parse.py format, not parser output. Pass a corpus written by
+batch_parse.py to measure real recipes.
+
+Usage: python -m benchmarks.memory [CORPUS] [-n COPIES] [--json]
+'''
+
+import argparse
+import json
+import os
+import recipe as r
+import sys
+
+from answers import StepAnswers
+from copy import deepcopy
+from fractions import Fraction
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           'fixtures', 'synthetic_recipes.jsonl')
+'''Hand-written recipe corpus used by default'''
+
+model_classes = (r.Ingredient, r.IntermediateIngredient, r.IngredientState,
+                 r.IngredientLedger, r.IngredientIndex, r.Step, r.Recipe,
+                 StepAnswers)
+'''Slotted classes whose instances are walked field by field'''
+
+class _Baseline:
+    '''Model object as the parser built it before __slots__, with its fields
+    in a per-instance __dict__'''
+
+    def __init__(self, **fields) -> None:
+        self.__dict__.update(fields)
+
+def _baseline_ingredient(data: dict) -> _Baseline:
+    return _Baseline(name=data['name'],
+                     quantity=r._fraction_from_data(data['quantity']),
+                     unit=data['unit'])
+
+def baseline_recipe(data: dict) -> _Baseline:
+    '''Builds the objects the parser kept for a recipe before this series,
+    from the output of Recipe.to_dict'''
+    ingredients = [_baseline_ingredient(ingr) for ingr in data['ingredients']]
+
+    # Every step shared one state, deep-copied from the ingredients and then
+    # used up step by step
+    remaining = deepcopy(ingredients)
+    state = _Baseline(remaining=list(remaining), intermediate=[], focus=-1)
+    for step in data['steps']:
+        for (ind, quantity) in step['consumed']:
+            ingr = remaining[ind]
+            if ingr not in state.remaining:
+                continue
+            quantity = r._fraction_from_data(quantity)
+            if ingr.quantity is None or ingr.quantity <= quantity:
+                state.remaining.remove(ingr)
+            else:
+                ingr.quantity -= quantity
+
+    steps = [_Baseline(text=step['text'],
+                       ingredients=[_baseline_ingredient(ingr)
+                                    for ingr in step['ingredients']],
+                       state=state, tools=step['tools'],
+                       methods=step['methods'], times=step['times'],
+                       temps=step['temps'])
+             for step in data['steps']]
+    return _Baseline(title=data['title'], ingredients=ingredients,
+                     tools=data['tools'], steps=steps, other=data['other'])
+
+def deep_size(roots: list) -> int:
+    '''Sums the sizes of all objects reachable from roots, counting shared
+    objects once'''
+    seen: set[int] = set()
+    total = 0
+    stack = list(roots)
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, model_classes):
+            stack.extend(getattr(obj, name) for name in type(obj).__slots__
+                         if hasattr(obj, name))
+        elif isinstance(obj, _Baseline):
+            total += sys.getsizeof(obj.__dict__)
+            stack.extend(obj.__dict__.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        elif isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, Fraction):
+            stack.extend([obj.numerator, obj.denominator])
+    return total
+
+def load_corpus(path: str, copies: int = 1) -> list[dict]:
+    '''Loads the recipe data of every successfully parsed corpus record,
+    decoding the corpus afresh for each copy so copies share no strings'''
+    with open(path, encoding='utf-8') as f:
+        lines = [line for line in f if line.strip()]
+    records = [json.loads(line) for _ in range(copies) for line in lines]
+    return [record['recipe'] for record in records if record.get('ok')]
+
+def run(path: str, copies: int) -> dict[str, float]:
+    '''Measures bytes per recipe now and as the parser kept them before'''
+    before = [baseline_recipe(d) for d in load_corpus(path, copies)]
+    after = [r.Recipe.from_dict(d) for d in load_corpus(path, copies)]
+    before_bytes = deep_size(before)
+    after_bytes = deep_size(after)
+    answer_bytes = deep_size([step.answers for recipe in after
+                              for step in recipe.steps])
+    return {'recipes': len(after),
+            'bytes_per_recipe_before': before_bytes / len(before),
+            'bytes_per_recipe_after': after_bytes / len(after),
+            'answer_bytes_per_recipe': answer_bytes / len(after),
+            'change': after_bytes / before_bytes - 1}
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('corpus', nargs='?', default=CORPUS_PATH,
+                            help='JSONL recipe corpus')
+    arg_parser.add_argument('-n', '--copies', type=int, default=100,
+                            help='number of times to load each recipe')
+    arg_parser.add_argument('--json', action='store_true',
+                            help='print results as JSON')
+    args = arg_parser.parse_args()
+    results = run(args.corpus, args.copies)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{results['recipes']} recipes: "
+              f"{results['bytes_per_recipe_after']:,.0f} bytes/recipe "
+              f"({results['answer_bytes_per_recipe']:,.0f} in step answers), "
+              f"against {results['bytes_per_recipe_before']:,.0f} before "
+              f"({results['change']:+.0%})")
@@ -0,0 +1,266 @@
+'''Offline benchmark of recipe parsing throughput over recipe pages.
+
+By default, parses the synthetic pages in benchmarks/fixtures/synthetic_html,
+one directory per recipe source, without touching the network. They are
+written by hand to imitate each source's markup, not saved from the sites,
+and one page per source carries its recipe as JSON-LD. Pass a directory of
+pages saved from the sites to measure real markup. Reports recipes parsed
+per second with the 50th and 95th percentile time per recipe, then parses
+every page once more with each stage of the parser timed: HTML parsing,
+tag classification, ingredient parsing, the SpaCy model, WordNet noun
+classification, ingredient state tracking and step answers. Time spent
+inside a stage's nested stages is counted only once, by the innermost.
+
+Before anything is timed, every page is also parsed as a stream of chunks
+of several sizes, and the benchmark stops if any of those recipes differs
+from the one parsed from the whole page.
+
+Usage: python -m benchmarks.parse_throughput [PATH] [-n REPEAT]
+       [--warm-nouns] [--json]
+'''
+
+import argparse
+import json
+import os
+import parser as p
+import recipe as r
+import resource
+import sys
+import time
+import util as u
+
+from answers import StepAnswers
+
+FIXTURES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             'fixtures', 'synthetic_html')
+'''Synthetic pages used by default, in a directory per recipe source'''
+
+STREAM_CHUNK_SIZES = (97, 1024, p.STREAM_CHUNK_SIZE)
+'''Sizes of the chunks pages are streamed in to check the parser'''
+
+stage_targets = dict([
+    ('html_parsing', [(p.RecipeHTMLParser, 'feed')]),
+    ('tag_classification', [(u.HTMLTag, 'from_tag')]),
+    ('ingredient_parsing', [(r.Ingredient, 'from_list_strs'),
+                            (r.Ingredient, 'from_str')]),
+    ('spacy', [(u.LazyNLP, '__call__'), (u.LazyNLP, 'pipe')]),
+    ('wordnet', [(u.NounType, 'from_str')]),
+    ('state_tracking', [(r.IngredientLedger, 'add_step'),
+                        (r.IngredientLedger, 'quantity'),
+                        (r.IngredientLedger, 'consume'),
+                        (r.IngredientIndex, 'find')]),
+    ('answers', [(StepAnswers, '__init__')])
+])
+'''Functions whose time is counted towards each stage'''
+
+###############
+# TIMER CLASS #
+###############
+
+class StageTimer:
+    '''Times the stages of the parser by temporarily wrapping the functions
+    in stage_targets'''
+
+    def __init__(self) -> None:
+        self.totals: dict[str, float] = dict.fromkeys(stage_targets, 0.)
+        '''Seconds spent in each stage, excluding nested stages'''
+        self.stack: list[list[float]] = []
+        '''Time spent in nested stages by each timed call in progress'''
+        self.patched: list[tuple[type, str, object]] = []
+        '''Class, attribute and original value of each wrapped function'''
+
+    def enter(self) -> None:
+        self.stack.append([0.])
+
+    def exit(self, stage: str, elapsed: float) -> None:
+        nested = self.stack.pop()[0]
+        self.totals[stage] += elapsed - nested
+        if self.stack:
+            self.stack[-1][0] += elapsed
+
+    def __timed(self, stage: str, func):
+        timer = self
+
+        def timed(*args, **kwargs):
+            timer.enter()
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            finally:
+                timer.exit(stage, time.perf_counter() - start)
+            if stage == 'spacy' and hasattr(result, '__next__'):
+                # Pipes parse lazily, as their docs are taken
+                return _TimedIterator(timer, stage, result)
+            return result
+        return timed
+
+    def __enter__(self) -> 'StageTimer':
+        for (stage, targets) in stage_targets.items():
+            for (owner, name) in targets:
+                original = owner.__dict__.get(name)
+                if isinstance(original, classmethod):
+                    wrapped = classmethod(
+                        self.__timed(stage, original.__func__))
+                else:
+                    wrapped = self.__timed(stage, getattr(owner, name))
+                self.patched.append((owner, name, original))
+                setattr(owner, name, wrapped)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        for (owner, name, original) in reversed(self.patched):
+            if original is None:
+                delattr(owner, name)
+            else:
+                setattr(owner, name, original)
+        self.patched = []
+
+class _TimedIterator:
+    '''Iterator that counts the time taken by each item towards a stage'''
+
+    def __init__(self, timer: StageTimer, stage: str, items) -> None:
+        self.timer = timer
+        self.stage = stage
+        self.items = items
+
+    def __iter__(self) -> '_TimedIterator':
+        return self
+
+    def __next__(self):
+        self.timer.enter()
+        start = time.perf_counter()
+        try:
+            return next(self.items)
+        finally:
+            self.timer.exit(self.stage, time.perf_counter() - start)
+
+####################
+# HELPER FUNCTIONS #
+####################
+
+def load_pages(path: str) -> list[tuple[u.RecipeSource, str, str]]:
+    '''Reads the source, name and HTML of every page under path'''
+    pages = []
+    for source_dir in sorted(os.scandir(path), key=lambda e: e.name):
+        if not source_dir.is_dir():
+            continue
+        source = u.RecipeSource[source_dir.name.upper()]
+        for entry in sorted(os.scandir(source_dir.path), key=lambda e: e.name):
+            if entry.name.endswith('.html'):
+                with open(entry.path, encoding='utf-8') as f:
+                    pages.append((source, entry.name[:-5], f.read()))
+    return pages
+
+def percentile(values: list[float], q: float) -> float:
+    '''Returns the nearest-rank percentile q (0 to 100) of values'''
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * q // 100))
+    return ordered[int(rank) - 1]
+
+def peak_rss_mib() -> float:
+    '''Returns the peak resident set size of this process in MiB'''
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+def stream_mismatches(source: u.RecipeSource, html: str,
+                      recipe: r.Recipe) -> list[int]:
+    '''Returns the chunk sizes at which streaming a page gives a different
+    recipe than parsing it whole'''
+    expected = recipe.to_dict()
+    return [size for size in STREAM_CHUNK_SIZES
+            if p.parse_recipe_stream(
+                (html[i:i + size] for i in range(0, len(html), size)),
+                source).to_dict() != expected]
+
+def parse_page(source: u.RecipeSource, html: str, warm_nouns: bool) -> float:
+    '''Parses a page and returns the time taken in seconds'''
+    if not warm_nouns:
+        u.clear_noun_type_cache()
+    start = time.perf_counter()
+    p.parse_recipe_html(html, source)
+    return time.perf_counter() - start
+
+def run(path: str, repeat: int, warm_nouns: bool = False) -> dict:
+    '''Measures parse throughput and the time spent in each stage'''
+    pages = load_pages(path)
+    if not pages:
+        raise SystemExit(f'No recipe pages under {path}')
+
+    # Load the SpaCy model and NLTK data before anything is timed
+    recipes = {}
+    mismatches = []
+    for (source, name, html) in pages:
+        recipe = p.parse_recipe_html(html, source)
+        page = f'{source.name.lower()}/{name}'
+        recipes[page] = dict([
+            ('ingredients', len(recipe.ingredients)),
+            ('steps', len(recipe.steps))
+        ])
+        mismatches.extend(f'{page} in {size}-character chunks'
+                          for size in stream_mismatches(source, html, recipe))
+    if mismatches:
+        raise SystemExit('Streamed parses differ from whole-page parses: '
+                         + ', '.join(mismatches))
+
+    times = []
+    by_source: dict[str, list[float]] = {}
+    for _ in range(repeat):
+        for (source, _, html) in pages:
+            elapsed = parse_page(source, html, warm_nouns)
+            times.append(elapsed)
+            by_source.setdefault(source.name.lower(), []).append(elapsed)
+
+    with StageTimer() as timer:
+        stage_start = time.perf_counter()
+        for (source, _, html) in pages:
+            parse_page(source, html, warm_nouns)
+        stage_total = time.perf_counter() - stage_start
+    stages = {stage: seconds / stage_total
+              for (stage, seconds) in timer.totals.items()}
+    stages['other'] = max(0., 1 - sum(stages.values()))
+
+    return dict([
+        ('recipes', recipes),
+        ('repeat', repeat),
+        ('warm_nouns', warm_nouns),
+        ('recipes_per_second', len(times) / sum(times)),
+        ('p50_ms', percentile(times, 50) * 1000),
+        ('p95_ms', percentile(times, 95) * 1000),
+        ('sources', {source: dict([
+            ('recipes_per_second', len(source_times) / sum(source_times)),
+            ('p50_ms', percentile(source_times, 50) * 1000),
+            ('p95_ms', percentile(source_times, 95) * 1000)
+        ]) for (source, source_times) in by_source.items()}),
+        ('stage_share', stages),
+        ('peak_rss_mib', peak_rss_mib())
+    ])
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('path', nargs='?', default=FIXTURES_PATH,
+                            help='directory of recipe pages, one '
+                                 'subdirectory per recipe source')
+    arg_parser.add_argument('-n', '--repeat', type=int, default=5,
+                            help='number of times each page is parsed')
+    arg_parser.add_argument('--warm-nouns', action='store_true',
+                            help='keep the noun type cache between recipes')
+    arg_parser.add_argument('--json', action='store_true',
+                            help='print results as JSON')
+    args = arg_parser.parse_args()
+    results = run(args.path, args.repeat, args.warm_nouns)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{len(results['recipes'])} pages x {results['repeat']}: "
+              f"{results['recipes_per_second']:,.1f} recipes/sec, "
+              f"p50 {results['p50_ms']:,.1f} ms, "
+              f"p95 {results['p95_ms']:,.1f} ms")
+        for (source, stats) in results['sources'].items():
+            print(f"  {source:<12} {stats['recipes_per_second']:,.1f} "
+                  f"recipes/sec, p50 {stats['p50_ms']:,.1f} ms, "
+                  f"p95 {stats['p95_ms']:,.1f} ms")
+        print('Share of parse time by stage:')
+        for (stage, share) in results['stage_share'].items():
+            print(f'  {stage:<20} {share:6.1%}')
+        print(f"Peak RSS: {results['peak_rss_mib']:,.1f} MiB")
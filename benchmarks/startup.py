@@ -0,0 +1,69 @@
+'''Cold-start benchmark for the parser and chatbot.
+
+Each measurement runs in a fresh interpreter, so that module imports and
+SpaCy model loading are timed from a cold start.
+
+Usage: python -m benchmarks.startup [-n RUNS] [--json]
+'''
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+scenarios = dict([
+    ("import util", "import util"),
+    ("import parser", "import parser"),
+    ("import recipe_chatbox", "import recipe_chatbox"),
+    ("first navigation parse",
+     "import util as u; u.nav_nlp('go to the next step')"),
+    ("first step parse",
+     "import util as u; u.nlp('preheat the oven to 350 degrees F.')"),
+    ("navigation then step parse",
+     "import util as u; u.nav_nlp('go to the next step'); "
+     "u.nlp('preheat the oven to 350 degrees F.')")
+])
+'''Code run after interpreter start for each scenario'''
+
+def time_scenario(code: str) -> float:
+    '''Runs code in a fresh interpreter and returns its duration in seconds'''
+    script = '\n'.join([
+        'import time',
+        't = time.perf_counter()',
+        code,
+        'print(time.perf_counter() - t)'
+    ])
+    out = subprocess.run([sys.executable, '-c', script], cwd=PROJECT_DIR,
+                         check=True, capture_output=True, text=True).stdout
+    return float(out.split()[-1])
+
+def run(runs: int) -> dict[str, dict[str, float]]:
+    '''Times every scenario and returns per-scenario summary statistics'''
+    results = {}
+    for (name, code) in scenarios.items():
+        times = [time_scenario(code) for _ in range(runs)]
+        results[name] = {
+            'min_s': min(times),
+            'median_s': statistics.median(times),
+            'max_s': max(times)
+        }
+    return results
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('-n', '--runs', type=int, default=3,
+                            help='number of cold starts per scenario')
+    arg_parser.add_argument('--json', action='store_true',
+                            help='print results as JSON')
+    args = arg_parser.parse_args()
+    results = run(args.runs)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for (name, stats) in results.items():
+            print(f"{name:<28} median {stats['median_s']:.3f}s "
+                  f"(min {stats['min_s']:.3f}s, max {stats['max_s']:.3f}s)")
@@ -0,0 +1,61 @@
+'''Microbenchmark of HTML tag classification throughput.
+
+Classifies a fixed, seeded mix of tags for every recipe source: tags the
+selectors match, near misses, and the unrelated tags that make up most of
+a page.
+
+Usage: python -m benchmarks.tag_dispatch [-n TAGS] [--json]
+'''
+
+import argparse
+import json
+import random
+import time
+import util as u
+
+unrelated_tags = [
+    ('a', [('href', '/recipes/'), ('class', 'link')]),
+    ('script', [('src', '/static/app.js'), ('async', None)]),
+    ('div', [('class', 'ad-slot'), ('id', 'ad-1')]),
+    ('span', [('class', 'icon')]),
+    ('img', [('src', '/img.jpg'), ('alt', '')]),
+    ('li', []),
+    ('p', [])
+]
+'''Tags that no source's selectors match'''
+
+def sample_tags(source: u.RecipeSource, count: int, seed: int = 0
+                ) -> list[tuple[str, list[tuple[str, str | None]]]]:
+    '''Builds a mix of tags, about 1 in 5 matching one of the source's
+    selectors'''
+    rng = random.Random(seed)
+    selected = [(tag, [attr] if kind == 'only'
+                 else [('id', 'x'), attr] if kind == 'has' else [])
+                for (tag, kind, attr, _) in u.tag_selectors[source]]
+    return [rng.choice(selected) if rng.random() < 0.2
+            else rng.choice(unrelated_tags) for _ in range(count)]
+
+def run(count: int) -> dict[str, float]:
+    '''Returns tags classified per second for each source'''
+    results = {}
+    for source in u.tag_selectors:
+        tags = sample_tags(source, count)
+        start = time.perf_counter()
+        for (tag, attrs) in tags:
+            u.HTMLTag.from_tag(source, tag, attrs)
+        results[source.name.lower()] = count / (time.perf_counter() - start)
+    return results
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('-n', '--tags', type=int, default=200_000,
+                            help='number of tags classified per source')
+    arg_parser.add_argument('--json', action='store_true',
+                            help='print results as JSON')
+    args = arg_parser.parse_args()
+    results = run(args.tags)
+    if args.json:
+        print(json.dumps({'tags_per_second': results}, indent=2))
+    else:
+        for (source, rate) in results.items():
+            print(f'{source:<12} {rate:,.0f} tags/sec')
@@ -0,0 +1,71 @@
+'''Builds the offline noun type lexicon used by util.NounType.
+
+Walks WordNet once, classifying every noun lemma under the noun type anchor
+synsets (plus irregular plural forms), and saves the results as a compact
+marisa-trie so that noun types can be resolved without loading WordNet.
+
+Usage: python build_lexicon.py [-o OUTPUT]
+'''
+
+import argparse
+import marisa_trie
+import os
+import util as u
+
+from nltk.corpus import wordnet as wn
+
+def iter_anchor_lemmas():
+    '''Yields the (lowercase) names of all noun lemmas under the anchors'''
+    seen = set()
+    for (_, names) in u.noun_type_anchors:
+        for name in names:
+            anchor = wn.synset(name)
+            for s in anchor.closure(lambda s: s.hyponyms()
+                                    + s.instance_hyponyms()):
+                if s in seen:
+                    continue
+                seen.add(s)
+                for lemma in s.lemma_names():
+                    yield lemma.lower()
+            for lemma in anchor.lemma_names():
+                yield lemma.lower()
+
+def iter_irregular_forms():
+    '''Yields irregular noun forms (e.g. geese) and their base forms'''
+    exceptions = getattr(wn, '_exception_map', {}).get(wn.NOUN, {})
+    for (form, bases) in exceptions.items():
+        yield (form, bases)
+
+def noun_type_mask(ntypes) -> int:
+    '''Packs a collection of noun types into a bit mask'''
+    mask = 0
+    for ntype in ntypes:
+        mask |= 1 << ntype.value
+    return mask
+
+def build_lexicon(path: str = u.NOUN_LEXICON_PATH) -> int:
+    '''Builds the lexicon at the given path and returns its number of keys'''
+    entries = {}
+    for lemma in iter_anchor_lemmas():
+        if lemma not in entries:
+            entries[lemma] = noun_type_mask(u.wordnet_noun_types(lemma))
+    for (form, bases) in iter_irregular_forms():
+        if any(base in entries for base in bases):
+            # Irregular forms are resolved by WordNet without suffix rules,
+            # so their types are stored as final.
+            entries[form] = noun_type_mask(u.wordnet_noun_types(form)) \
+                | u.NOUN_LEXICON_EXACT
+
+    records = [(lemma, (mask,)) for (lemma, mask) in entries.items() if mask]
+    trie = marisa_trie.RecordTrie('<B', records)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    trie.save(path)
+    return len(records)
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('-o', '--output', default=u.NOUN_LEXICON_PATH,
+                            help='path to write the lexicon to')
+    args = arg_parser.parse_args()
+    count = build_lexicon(args.output)
+    print(f'Wrote {count} noun types to {args.output}')
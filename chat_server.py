@@ -0,0 +1,270 @@
+'''Serves the Recipe Chatbox to many users at once over TCP.
+
+Each connection is its own chat session with its own Context, speaking a
+line protocol: the client sends one message per line, and the server sends
+back each reply followed by an empty line. The SpaCy model and parsed
+recipes are shared by all sessions, and recipes are parsed in worker
+processes so a slow page never stalls other sessions. Sessions are
+snapshotted after every message, and 'resume <id>' continues one after a
+reconnect or restart.
+
+Usage: python chat_server.py [--host HOST] [--port PORT] [-j WORKERS]
+'''
+
+import argparse
+import asyncio
+import recipe as r
+import re
+import recipe_chatbox as chat
+import traceback
+import util as u
+
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor
+from ingest import ingest
+from intent_classifier import default_classifier
+from parser import normalize_url
+from recipe_cache import RecipeCache, default_cache
+from session_store import SessionStore
+
+#############
+# VARIABLES #
+#############
+
+HOST = '127.0.0.1'
+'''Address the server listens on by default'''
+
+PORT = 8337
+'''Port the server listens on by default'''
+
+MAX_RECIPES = 128
+'''Number of parsed recipes kept in memory for all sessions'''
+
+MAX_LINE = 64 * 1024
+'''Longest message a client may send, in bytes'''
+
+EVICT_INTERVAL = 60
+'''Seconds between checks for idle sessions'''
+
+failed_turn = "Sorry, something went wrong. Please try again."
+'''Reply to a message whose handling raised an error'''
+
+resume_re = re.compile(r'resume\s+([\w-]+)', re.IGNORECASE)
+'''Message that switches the connection to an earlier session'''
+
+################
+# SERVER CLASS #
+################
+
+class ChatServer:
+    '''Runs chat sessions, sharing fetched recipes between them'''
+
+    def __init__(self, executor: Executor, store: SessionStore,
+                 cache: RecipeCache | None = None,
+                 max_recipes: int = MAX_RECIPES) -> None:
+        self.executor = executor
+        '''Pool that recipe pages are parsed in'''
+        self.store = store
+        '''Sessions by ID, so users can resume them later'''
+        self.cache = cache
+        '''Persistent cache of parsed recipes, if any'''
+        self.max_recipes = max_recipes
+        '''Number of parsed recipes kept in memory'''
+        self.recipes: OrderedDict[str, r.Recipe] = OrderedDict()
+        '''Recently used recipes by URL, least recent first'''
+        self.pending: dict[str, asyncio.Task] = {}
+        '''Recipes being fetched by URL, so sessions share one fetch'''
+        self.sessions = 0
+        '''Number of connected sessions'''
+        self.live: set[str] = set()
+        '''IDs of the sessions in use by a connection'''
+
+    async def __fetch(self, url: str) -> r.Recipe | None:
+        recipe = None
+        async for result in ingest([url], cache=self.cache,
+                                   executor=self.executor):
+            recipe = result.recipe
+        return recipe
+
+    async def get_recipe(self, url: str) -> r.Recipe | None:
+        '''Returns the recipe at a URL, fetching it if no session has'''
+        key = normalize_url(url)
+        recipe = self.recipes.get(key)
+        if recipe is not None:
+            self.recipes.move_to_end(key)
+            return recipe
+
+        task = self.pending.get(key)
+        if task is None:
+            task = asyncio.create_task(self.__fetch(url))
+            self.pending[key] = task
+            task.add_done_callback(lambda _: self.pending.pop(key, None))
+        # A session disconnecting must not cancel a fetch others await
+        recipe = await asyncio.shield(task)
+
+        if recipe is not None:
+            self.recipes[key] = recipe
+            self.recipes.move_to_end(key)
+            while len(self.recipes) > self.max_recipes:
+                self.recipes.popitem(last=False)
+        return recipe
+
+    async def turn(self, context: chat.Context, message: str) -> str:
+        '''Returns the reply to one message of a session'''
+        if context.current_recipe is None:
+            recipe = await self.get_recipe(message)
+            return chat.start_recipe(context, message, recipe)
+        # Replies may run the SpaCy model, so they run off the event loop
+        return await asyncio.to_thread(chat.respond, context,
+                                       message.lower())
+
+    async def resume(self, session_id: str) -> chat.Context | None:
+        '''Claims a stored session for a connection and returns it with its
+        recipe loaded, if it exists and no other connection has it'''
+        if session_id in self.live:
+            return None
+        # Claim it before waiting, so no other connection resumes it too
+        self.live.add(session_id)
+        context = None
+        try:
+            context = await self.__load_session(session_id)
+        finally:
+            if context is None:
+                self.live.discard(session_id)
+        return context
+
+    async def __load_session(self, session_id: str) -> chat.Context | None:
+        context = await asyncio.to_thread(self.store.get, session_id)
+        if context is None or context.finished:
+            return None
+        if context.current_recipe is None and context.recipe_url:
+            context.current_recipe = await self.get_recipe(context.recipe_url)
+            if context.current_recipe is None:
+                context.recipe_url = None
+        return context
+
+    async def handle(self, reader: asyncio.StreamReader,
+                     writer: asyncio.StreamWriter) -> None:
+        '''Runs the chat session of one connection'''
+        self.sessions += 1
+        session_id, context = self.store.create()
+        self.live.add(session_id)
+
+        async def send(text: str) -> None:
+            # Blank lines end a reply, so none may appear inside one
+            lines = [line for line in text.splitlines() if line.strip()]
+            writer.write('\n'.join([*lines, '', '']).encode())
+            await writer.drain()
+
+        try:
+            await send(f'Welcome to Recipe Chatbox! {resume_tip(session_id)}'
+                       f'\n{chat.url_request}')
+            while not context.finished:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = line.decode(errors='replace').strip()
+                if not message:
+                    continue
+                try:
+                    if match := resume_re.fullmatch(message):
+                        if match[1] == session_id:
+                            reply = resumed_reply(context)
+                        elif match[1] in self.live:
+                            # Two connections must not share one context
+                            reply = (f"Sorry, session {match[1]} is in use "
+                                     f"on another connection.")
+                        elif (resumed := await self.resume(match[1])) \
+                                is None:
+                            reply = f"Sorry, there is no session {match[1]}."
+                        else:
+                            self.store.discard(session_id)
+                            self.live.discard(session_id)
+                            session_id, context = match[1], resumed
+                            reply = resumed_reply(context)
+                    else:
+                        reply = await self.turn(context, message)
+                    if context.finished:
+                        self.store.discard(session_id)
+                    else:
+                        self.store.put(session_id, context)
+                        await asyncio.to_thread(self.store.save, session_id,
+                                                context)
+                except Exception:
+                    # One bad message or recipe must not end the session
+                    traceback.print_exc()
+                    reply = failed_turn
+                await send(reply)
+        except (ConnectionError, ValueError):
+            # The client went away, or sent a line over MAX_LINE
+            pass
+        finally:
+            self.sessions -= 1
+            self.live.discard(session_id)
+            writer.close()
+
+####################
+# HELPER FUNCTIONS #
+####################
+
+def resume_tip(session_id: str) -> str:
+    return (f"Your session ID is {session_id}. To continue this session "
+            f"later, enter 'resume {session_id}'.")
+
+def resumed_reply(context: chat.Context) -> str:
+    if context.current_recipe is None:
+        return f"Welcome back! {chat.url_request}"
+    steps = context.current_recipe.steps
+    return "\n".join([
+        f"Welcome back to '{context.current_recipe.title}'! You have done "
+        f"{context.current_step} of {len(steps)} steps.",
+        f"{chat.shortcut_tip} or ask any other questions you have"
+    ])
+
+async def evict_idle(store: SessionStore, interval: float) -> None:
+    '''Periodically moves idle sessions out of memory'''
+    while True:
+        await asyncio.sleep(interval)
+        await asyncio.to_thread(store.evict_idle)
+
+#################
+# API FUNCTIONS #
+#################
+
+async def serve(host: str = HOST, port: int = PORT,
+                workers: int | None = None) -> None:
+    '''Serves chat sessions until cancelled'''
+    # Load every model before sessions can race to load them in threads
+    await asyncio.to_thread(u.load_models)
+    await asyncio.to_thread(default_classifier().load)
+    store = SessionStore()
+    await asyncio.to_thread(store.prune)
+    evictor = asyncio.create_task(evict_idle(store, EVICT_INTERVAL))
+    try:
+        with ProcessPoolExecutor(max_workers=workers,
+                                 initializer=u.load_models) as executor:
+            server = ChatServer(executor, store, default_cache())
+            tcp = await asyncio.start_server(server.handle, host, port,
+                                             limit=MAX_LINE)
+            async with tcp:
+                await tcp.serve_forever()
+    finally:
+        evictor.cancel()
+        # Snapshot every session so they can be resumed after a restart
+        store.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Serve the Recipe Chatbox over a TCP line protocol.')
+    parser.add_argument('--host', default=HOST,
+                        help=f'address to listen on (default {HOST})')
+    parser.add_argument('--port', type=int, default=PORT,
+                        help=f'port to listen on (default {PORT})')
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help='recipe parsing processes (default: all cores)')
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,207 @@
+'''Pooled, timeout-aware HTTP fetching of recipe pages.'''
+
+import requests
+import sys
+import threading
+
+from collections import OrderedDict
+from collections.abc import Iterator
+from functools import lru_cache
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlsplit, urlunsplit
+from urllib3.util.retry import Retry
+
+#############
+# VARIABLES #
+#############
+
+CONNECT_TIMEOUT = 5.0
+'''Seconds to wait for a connection to be established'''
+
+READ_TIMEOUT = 20.0
+'''Seconds to wait between bytes received from the server'''
+
+MAX_RETRIES = 3
+'''Number of times to retry a failed request'''
+
+BACKOFF_FACTOR = 0.5
+'''Base delay between retries, doubled after each one'''
+
+POOL_CONNECTIONS = 8
+'''Number of hosts to keep connection pools for'''
+
+POOL_MAXSIZE = 10
+'''Number of keep-alive connections kept per host'''
+
+MAX_CACHED_BYTES = 32 * 1024 * 1024
+'''Memory used by the text of pages remembered for conditional requests'''
+
+retry_statuses = [429, 500, 502, 503, 504]
+'''HTTP statuses that are worth retrying'''
+
+#################
+# FETCHER CLASS #
+#################
+
+class Fetcher:
+    '''HTTP client sharing one session (and its connection pools) across
+    requests'''
+
+    def __init__(self, connect_timeout: float = CONNECT_TIMEOUT,
+                 read_timeout: float = READ_TIMEOUT,
+                 retries: int = MAX_RETRIES,
+                 backoff_factor: float = BACKOFF_FACTOR,
+                 pool_connections: int = POOL_CONNECTIONS,
+                 pool_maxsize: int = POOL_MAXSIZE,
+                 max_cached_bytes: int = MAX_CACHED_BYTES,
+                 host_overrides: dict[str, str] | None = None) -> None:
+        self.timeout = (connect_timeout, read_timeout)
+        '''(connect, read) timeouts passed to every request'''
+        self.host_overrides = dict(host_overrides or {})
+        '''Hosts to redirect to another base URL, e.g. a local test server:
+        {'www.allrecipes.com': 'http://127.0.0.1:8000'}'''
+        self.max_cached_bytes = max_cached_bytes
+        '''Memory used by the text of pages remembered for conditional
+        requests, or 0 to not remember any'''
+        self.validators: OrderedDict[
+            str, tuple[dict[str, str], str, bool]] = OrderedDict()
+        '''Conditional request headers, cached text and whether the text is
+        the whole page, by URL, least recently used first'''
+        self.cached_bytes = 0
+        '''Memory used by the cached text'''
+        self.lock = threading.Lock()
+
+        retry = Retry(total=retries, connect=retries, read=retries,
+                      backoff_factor=backoff_factor,
+                      status_forcelist=retry_statuses,
+                      allowed_methods=['GET', 'HEAD'],
+                      raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=pool_connections,
+                              pool_maxsize=pool_maxsize, max_retries=retry)
+        self.session = requests.Session()
+        '''Shared session holding keep-alive connections'''
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers['Accept-Encoding'] = 'gzip, deflate'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        '''Closes all pooled connections'''
+        self.session.close()
+
+    def resolve(self, url: str) -> str:
+        '''Applies any host override to a URL'''
+        parts = urlsplit(url)
+        base = self.host_overrides.get(parts.netloc)
+        if base is None:
+            return url
+        base = urlsplit(base)
+        return urlunsplit((base.scheme, base.netloc,
+                           base.path.rstrip('/') + parts.path,
+                           parts.query, parts.fragment))
+
+    def get(self, url: str, stream: bool = False,
+            headers: dict[str, str] | None = None) -> requests.Response:
+        '''Sends a GET request, raising for HTTP errors'''
+        response = self.session.get(self.resolve(url), headers=headers,
+                                    timeout=self.timeout, stream=stream)
+        if response.status_code != 304:
+            response.raise_for_status()
+        return response
+
+    def iter_text(self, url: str, chunk_size: int) -> Iterator[str]:
+        '''Yields the text of a page as it downloads, revalidating it if seen
+        before. Closing the iterator early stops the download.'''
+        cached = self.__cached(url)
+        skip = 0
+        if cached:
+            (validators, text, complete) = cached
+            with self.get(url, stream=True, headers=validators) as f:
+                if f.status_code != 304:
+                    yield from self.__stream(url, f, chunk_size)
+                    return
+            self.__touch(url)
+            yield text
+            if complete:
+                return
+            # Only the start of the page was kept, so download the rest
+            skip = len(text)
+        with self.get(url, stream=True) as f:
+            yield from self.__stream(url, f, chunk_size, skip)
+
+    def __stream(self, url: str, response: requests.Response,
+                 chunk_size: int, skip: int = 0) -> Iterator[str]:
+        if response.encoding is None:
+            response.encoding = 'utf-8'
+        chunks = []
+        try:
+            for chunk in response.iter_content(chunk_size,
+                                               decode_unicode=True):
+                chunks.append(chunk)
+                if skip >= len(chunk):
+                    skip -= len(chunk)
+                    continue
+                yield chunk[skip:]
+                skip = 0
+        except GeneratorExit:
+            # Keep what was read, so an unchanged page can be replayed up to
+            # where the caller stopped
+            self.__remember(url, response, ''.join(chunks), False)
+            raise
+        self.__remember(url, response, ''.join(chunks), True)
+
+    def fetch(self, url: str) -> str:
+        '''Returns the text of a page, revalidating it if seen before'''
+        cached = self.__cached(url)
+        # Only a whole page can stand in for one that has not changed
+        if cached and not cached[2]:
+            cached = None
+        with self.get(url, headers=cached[0] if cached else None) as f:
+            if f.status_code == 304 and cached:
+                self.__touch(url)
+                return cached[1]
+            text = f.text
+            self.__remember(url, f, text, True)
+        return text
+
+    def __cached(self, url: str) -> tuple[dict[str, str], str, bool] | None:
+        with self.lock:
+            return self.validators.get(url)
+
+    def __touch(self, url: str) -> None:
+        with self.lock:
+            if url in self.validators:
+                self.validators.move_to_end(url)
+
+    def __forget(self, url: str) -> None:
+        # Callers hold the lock
+        entry = self.validators.pop(url, None)
+        if entry is not None:
+            self.cached_bytes -= sys.getsizeof(entry[1])
+
+    def __remember(self, url: str, response: requests.Response, text: str,
+                   complete: bool) -> None:
+        validators = {}
+        if 'ETag' in response.headers:
+            validators['If-None-Match'] = response.headers['ETag']
+        if 'Last-Modified' in response.headers:
+            validators['If-Modified-Since'] = response.headers['Last-Modified']
+        size = sys.getsizeof(text)
+        with self.lock:
+            self.__forget(url)
+            if not validators or size > self.max_cached_bytes:
+                return
+            self.validators[url] = (validators, text, complete)
+            self.cached_bytes += size
+            while self.cached_bytes > self.max_cached_bytes:
+                self.__forget(next(iter(self.validators)))
+
+@lru_cache(maxsize=1)
+def default_fetcher() -> Fetcher:
+    '''Returns the fetcher shared by the whole process'''
+    return Fetcher()
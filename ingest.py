@@ -0,0 +1,158 @@
+'''Concurrent bulk ingestion of many recipe URLs.
+
+Pages are fetched concurrently (with a limit per host) while already
+fetched pages are parsed, so network latency overlaps with NLP work.
+
+Example:
+    async for result in ingest(urls):
+        if result.recipe:
+            ...
+'''
+
+import asyncio
+import recipe as r
+import time
+import util as u
+
+from collections.abc import AsyncIterator, Iterable
+from concurrent.futures import Executor, ProcessPoolExecutor, \
+    ThreadPoolExecutor
+from fetcher import Fetcher, default_fetcher
+from parser import normalize_url, parse_recipe_html
+from recipe_cache import RecipeCache
+from urllib.parse import urlsplit
+
+#############
+# VARIABLES #
+#############
+
+MAX_CONCURRENCY = 32
+'''Number of pages fetched at once'''
+
+PER_HOST_CONCURRENCY = 4
+'''Number of pages fetched at once from any one host'''
+
+################
+# RESULT CLASS #
+################
+
+class IngestResult:
+    '''Struct holding the outcome of ingesting one URL'''
+
+    def __init__(self, url: str, recipe: r.Recipe | None = None,
+                 error: str | None = None, elapsed: float = 0.0,
+                 cached: bool = False):
+        self.url = url
+        '''URL of the recipe, as given'''
+        self.recipe = recipe
+        '''Parsed recipe, or None if it could not be ingested'''
+        self.error = error
+        '''Description of what went wrong, if anything'''
+        self.elapsed = elapsed
+        '''Seconds taken to fetch and parse the recipe'''
+        self.cached = cached
+        '''Whether the recipe came from the cache'''
+
+####################
+# HELPER FUNCTIONS #
+####################
+
+def parse_recipe_bytes(html: str, source_value: int) -> bytes:
+    '''Parses recipe HTML into the recipe's encoding, for worker processes'''
+    return parse_recipe_html(html, u.RecipeSource(source_value)).to_bytes()
+
+async def _parse(html: str, source: u.RecipeSource,
+                 executor: Executor) -> r.Recipe:
+    loop = asyncio.get_running_loop()
+    if isinstance(executor, ProcessPoolExecutor):
+        # Recipes cross the process boundary in their compact encoding
+        data = await loop.run_in_executor(executor, parse_recipe_bytes,
+                                          html, source.value)
+        return r.Recipe.from_bytes(data)
+    return await loop.run_in_executor(executor, parse_recipe_html,
+                                      html, source)
+
+async def _ingest_one(url: str, fetcher: Fetcher, cache: RecipeCache | None,
+                      executor: Executor, io: Executor,
+                      limit: asyncio.Semaphore,
+                      host_limits: dict[str, asyncio.Semaphore],
+                      per_host: int) -> IngestResult:
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    source = u.RecipeSource.from_url(url)
+    if source == u.RecipeSource.UNKNOWN:
+        return IngestResult(url, error='unsupported recipe source')
+    full_url = normalize_url(url)
+
+    try:
+        if cache is not None:
+            recipe = await loop.run_in_executor(io, cache.get, full_url)
+            if recipe is not None:
+                return IngestResult(url, recipe,
+                                    elapsed=time.perf_counter() - start,
+                                    cached=True)
+
+        host = urlsplit(full_url).netloc
+        host_limit = host_limits.setdefault(host, asyncio.Semaphore(per_host))
+        # Wait for the host first, so pages queued for one busy host don't
+        # hold the slots other hosts could use
+        async with host_limit, limit:
+            html = await loop.run_in_executor(io, fetcher.fetch, full_url)
+
+        recipe = await _parse(html, source, executor)
+        if cache is not None and recipe.steps:
+            await loop.run_in_executor(io, cache.put, full_url, recipe)
+    except Exception as e:
+        return IngestResult(url, error=f'{type(e).__name__}: {e}',
+                            elapsed=time.perf_counter() - start)
+    return IngestResult(url, recipe, elapsed=time.perf_counter() - start)
+
+#################
+# API FUNCTIONS #
+#################
+
+async def ingest(urls: Iterable[str], fetcher: Fetcher | None = None,
+                 cache: RecipeCache | None = None,
+                 executor: Executor | None = None,
+                 max_concurrency: int = MAX_CONCURRENCY,
+                 per_host: int = PER_HOST_CONCURRENCY
+                 ) -> AsyncIterator[IngestResult]:
+    '''Fetches and parses many recipe URLs concurrently, yielding results
+    as they complete.
+
+    Parsing runs in the given executor. A ProcessPoolExecutor parses on all
+    cores; by default a single worker thread parses while fetches continue.
+    Fetches and cache lookups run in a pool of max_concurrency threads of
+    their own, not the event loop's default executor, whose size would cap
+    them.
+    '''
+    fetcher = fetcher or default_fetcher()
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(max_workers=1)
+    io = ThreadPoolExecutor(max_workers=max_concurrency,
+                            thread_name_prefix='ingest-io')
+    limit = asyncio.Semaphore(max_concurrency)
+    host_limits: dict[str, asyncio.Semaphore] = {}
+
+    tasks = [asyncio.create_task(_ingest_one(url, fetcher, cache, executor,
+                                             io, limit, host_limits,
+                                             per_host))
+             for url in urls]
+    try:
+        for task in asyncio.as_completed(tasks):
+            yield await task
+    finally:
+        for task in tasks:
+            task.cancel()
+        if own_executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+        io.shutdown(wait=False, cancel_futures=True)
+
+def ingest_all(urls: Iterable[str], **kwargs) -> list[IngestResult]:
+    '''Synchronously ingests many recipe URLs; see ingest'''
+
+    async def collect():
+        return [result async for result in ingest(urls, **kwargs)]
+
+    return asyncio.run(collect())
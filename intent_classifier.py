@@ -0,0 +1,200 @@
+'''Nearest-neighbour intent classifier over the examples in nlu.yml, using the
+word vectors of the SpaCy model'''
+
+import argparse
+import hashlib
+import numpy as np
+import os
+import srsly
+import sys
+import threading
+import util as u
+import zipfile
+
+from functools import lru_cache
+from typing import Iterable
+
+#############
+# VARIABLES #
+#############
+
+NLU_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'nlu.yml')
+'''Location of the training examples'''
+
+INTENT_CACHE_PATH = os.environ.get(
+    'INTENT_CACHE_PATH',
+    os.path.join(os.path.expanduser('~'), '.cache', 'recipe_chatbox',
+                 'intents.npz'))
+'''Location of the embedded training examples'''
+
+INTENT_CACHE_VERSION = 1
+'''Version of the cached example matrix, part of its key'''
+
+NEIGHBOURS = 3
+'''Number of nearest examples that vote on an intent'''
+
+MIN_SIMILARITY = 0.8
+'''Cosine similarity below which a message has no intent'''
+
+BATCH_SIZE = 256
+'''Messages embedded per call to the tokenizer'''
+
+####################
+# HELPER FUNCTIONS #
+####################
+
+def load_examples(path: str = NLU_PATH) -> list[tuple[str, str]]:
+    '''Reads the (intent, example) pairs of a Rasa NLU file'''
+    examples = []
+    for entry in srsly.read_yaml(path).get('nlu', []):
+        if 'intent' not in entry:
+            continue
+        for line in entry.get('examples', '').splitlines():
+            line = line.strip()
+            if line.startswith('- '):
+                examples.append((entry['intent'], line[2:].strip()))
+    return examples
+
+def embed(texts: Iterable[str], batch_size: int = BATCH_SIZE) -> np.ndarray:
+    '''Embeds texts as unit-length rows of averaged word vectors. Texts
+    without any known word are left as zero rows.'''
+    # Word vectors only need the tokenizer, not the rest of the pipeline
+    rows = [doc.vector for doc in u.nav_nlp.tokenizer.pipe(
+        texts, batch_size=batch_size)]
+    if not rows:
+        return np.zeros((0, u.nav_nlp.vocab.vectors_length), np.float32)
+    matrix = np.asarray(rows, np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
+
+def _cache_key(path: str) -> str:
+    with open(path, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    return f'{INTENT_CACHE_VERSION}:{u.NLP_MODEL}:{digest}'
+
+####################
+# CLASSIFIER CLASS #
+####################
+
+class IntentClassifier:
+    '''Classifies messages by a similarity-weighted vote of their nearest
+    training examples'''
+
+    def __init__(self, path: str = NLU_PATH,
+                 cache_path: str | None = INTENT_CACHE_PATH,
+                 neighbours: int = NEIGHBOURS,
+                 min_similarity: float = MIN_SIMILARITY) -> None:
+        self.path = path
+        '''Location of the training examples'''
+        self.cache_path = cache_path
+        '''Location of the embedded examples, or None to not cache them'''
+        self.neighbours = neighbours
+        '''Number of nearest examples that vote on an intent'''
+        self.min_similarity = min_similarity
+        '''Cosine similarity below which a message has no intent'''
+        self.intents: list[str] = []
+        '''Names of the intents'''
+        self.labels: np.ndarray | None = None
+        '''Index into intents of each example'''
+        self.matrix: np.ndarray | None = None
+        '''Unit-length embedding of each example'''
+        self.lock = threading.Lock()
+
+    def __load_cache(self, key: str) -> bool:
+        try:
+            with np.load(self.cache_path, allow_pickle=False) as data:
+                if str(data['key']) != key:
+                    return False
+                self.intents = data['intents'].tolist()
+                self.labels = data['labels']
+                self.matrix = data['matrix']
+        except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+            return False
+        return True
+
+    def __save_cache(self, key: str) -> None:
+        os.makedirs(os.path.dirname(self.cache_path) or '.', exist_ok=True)
+        tmp = f'{self.cache_path}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            np.savez(f, key=np.array(key), intents=np.array(self.intents),
+                     labels=self.labels, matrix=self.matrix)
+        os.replace(tmp, self.cache_path)
+
+    def load(self) -> 'IntentClassifier':
+        '''Embeds the training examples, or reads them from the cache if the
+        training file and model are unchanged'''
+        with self.lock:
+            if self.matrix is not None:
+                return self
+            key = _cache_key(self.path)
+            if self.cache_path and self.__load_cache(key):
+                return self
+
+            examples = load_examples(self.path)
+            self.intents = sorted({intent for intent, _ in examples})
+            index = {intent: i for i, intent in enumerate(self.intents)}
+            self.labels = np.array([index[intent] for intent, _ in examples],
+                                   np.int32)
+            self.matrix = embed(text for _, text in examples)
+            if self.cache_path:
+                try:
+                    self.__save_cache(key)
+                except OSError:
+                    pass
+            return self
+
+    def classify_batch(self, texts: Iterable[str],
+                       batch_size: int = BATCH_SIZE
+                       ) -> list[tuple[str | None, float]]:
+        '''Returns the intent of each message and its similarity, or None
+        if no example is similar enough'''
+        self.load()
+        queries = embed(texts, batch_size)
+        if not len(queries) or not len(self.matrix):
+            return [(None, 0.) for _ in range(len(queries))]
+
+        similarity = queries @ self.matrix.T
+        k = min(self.neighbours, similarity.shape[1])
+        nearest = np.argpartition(-similarity, k - 1, axis=1)[:, :k]
+        nearest_sim = np.take_along_axis(similarity, nearest, axis=1)
+
+        # Each neighbour votes for its intent with its similarity
+        votes = np.zeros((len(queries), len(self.intents)), np.float32)
+        rows = np.repeat(np.arange(len(queries)), k)
+        np.add.at(votes, (rows, self.labels[nearest].ravel()),
+                  np.clip(nearest_sim, 0, None).ravel())
+        best = votes.argmax(axis=1)
+        best_sim = np.where(self.labels[nearest] == best[:, None],
+                            nearest_sim, 0).max(axis=1)
+
+        return [(self.intents[i] if sim >= self.min_similarity else None,
+                 float(sim)) for i, sim in zip(best, best_sim)]
+
+    def classify(self, text: str) -> tuple[str | None, float]:
+        '''Returns the intent of a message and its similarity'''
+        return self.classify_batch([text])[0]
+
+@lru_cache(maxsize=None)
+def default_classifier() -> IntentClassifier:
+    '''Classifier over nlu.yml shared by the chatbot'''
+    return IntentClassifier()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Classify each line of a transcript by intent.')
+    parser.add_argument('input', nargs='?', default='-',
+                        help="transcript file, or '-' for standard input")
+    parser.add_argument('--nlu', default=NLU_PATH,
+                        help='training examples in Rasa NLU format')
+    args = parser.parse_args()
+
+    if args.input == '-':
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(args.input, encoding='utf-8') as f:
+            lines = f.read().splitlines()
+
+    classifier = IntentClassifier(args.nlu)
+    for line, (intent, sim) in zip(lines, classifier.classify_batch(lines)):
+        print(f'{intent or "-"}\t{sim:.3f}\t{line}')
@@ -0,0 +1,164 @@
+'''Extraction of recipes from embedded JSON-LD structured data.'''
+
+import html
+import re
+import srsly
+
+#############
+# VARIABLES #
+#############
+
+_script_re = re.compile(r'<script\b[^>]*\btype=["\']?application/ld\+json'
+                        r'["\']?[^>]*>(.*?)</script\s*>',
+                        re.IGNORECASE | re.DOTALL)
+
+_duration_re = re.compile(r'P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?'
+                          r'(?:(\d+(?:\.\d+)?)S)?)?$')
+
+duration_fields = dict([
+    ("prepTime", "prep time"),
+    ("cookTime", "cook time"),
+    ("totalTime", "total time")
+])
+'''JSON-LD duration fields and the overview labels they correspond to'''
+
+######################
+# RECIPE DATA STRUCT #
+######################
+
+class RecipeData:
+    '''Struct holding the raw recipe fields found in structured data'''
+
+    def __init__(self):
+        self.title: str = ""
+        '''Title of the recipe'''
+        self.ingredients: list[str] = []
+        '''Ingredient list entries, e.g. 1 cup flour'''
+        self.instructions: list[str] = []
+        '''Instruction texts, in order'''
+        self.other: dict[str, str] = {}
+        '''Other miscellaneous recipe information, by overview label'''
+
+####################
+# HELPER FUNCTIONS #
+####################
+
+def _clean(text) -> str:
+    return html.unescape(str(text)).strip() if text else ''
+
+def _is_text(value) -> bool:
+    # Numbers are fine as text, but booleans are not
+    return isinstance(value, (str, int, float)) and not isinstance(value, bool)
+
+def _ingredient_texts(ingredients) -> list[str] | None:
+    '''Lists the recipeIngredient entries, or returns None if they are not
+    strings'''
+    if isinstance(ingredients, str):
+        ingredients = ingredients.splitlines()
+    if not isinstance(ingredients, list) or \
+            not all(_is_text(item) for item in ingredients):
+        return None
+    return [text for text in map(_clean, ingredients) if text]
+
+def _is_recipe(obj) -> bool:
+    if not isinstance(obj, dict):
+        return False
+    types = obj.get('@type')
+    return types == 'Recipe' or (isinstance(types, list) and 'Recipe' in types)
+
+def _find_recipe_object(obj):
+    '''Finds the Recipe object in a JSON-LD document, which may be nested in
+    lists or an @graph'''
+    if _is_recipe(obj):
+        return obj
+    if isinstance(obj, dict):
+        obj = obj.get('@graph', [])
+    if isinstance(obj, list):
+        for item in obj:
+            found = _find_recipe_object(item)
+            if found is not None:
+                return found
+    return None
+
+def _instruction_texts(instructions) -> list[str]:
+    '''Flattens recipeInstructions (strings, HowToSteps and HowToSections)
+    into a list of texts'''
+    if isinstance(instructions, str):
+        return [text for text in map(_clean, instructions.splitlines())
+                if text]
+    texts = []
+    if isinstance(instructions, list):
+        for item in instructions:
+            if isinstance(item, str):
+                texts.extend(_instruction_texts(item))
+            elif isinstance(item, dict):
+                if 'itemListElement' in item:
+                    texts.extend(_instruction_texts(item['itemListElement']))
+                elif _is_text(item.get('text')):
+                    texts.append(_clean(item['text']))
+    return texts
+
+def format_duration(duration: str) -> str | None:
+    '''Formats an ISO 8601 duration like PT1H30M as 1 hr 30 mins'''
+    if not isinstance(duration, str):
+        return None
+    match = _duration_re.match(duration.strip())
+    if not match or not any(match.groups()):
+        return None
+    parts = []
+    for (value, unit) in zip(match.groups(), ['day', 'hr', 'min', 'sec']):
+        if value and float(value):
+            value = value.rstrip('0').rstrip('.') if '.' in value else value
+            parts.append(f"{value} {unit}{'' if value == '1' else 's'}")
+    return ' '.join(parts) or None
+
+#################
+# API FUNCTIONS #
+#################
+
+def recipe_data_from_json(obj) -> RecipeData | None:
+    '''Extracts recipe fields from a loaded JSON-LD document, if it holds a
+    recipe with instructions and its fields have the expected types'''
+    obj = _find_recipe_object(obj)
+    if obj is None:
+        return None
+    data = RecipeData()
+    data.instructions = _instruction_texts(obj.get('recipeInstructions'))
+    if not data.instructions:
+        return None
+    name = obj.get('name')
+    data.title = _clean(name) if _is_text(name) else ''
+    ingredients = _ingredient_texts(
+        obj.get('recipeIngredient') or obj.get('ingredients') or [])
+    if ingredients is None:
+        # Scraping the page beats a recipe without its ingredients
+        return None
+    data.ingredients = ingredients
+    for (field, label) in duration_fields.items():
+        duration = format_duration(obj.get(field))
+        if duration:
+            data.other[label] = duration
+    servings = obj.get('recipeYield')
+    if isinstance(servings, list):
+        servings = servings[0] if servings else None
+    if servings and _is_text(servings):
+        data.other['servings'] = _clean(servings)
+    return data
+
+def recipe_data_from_script(text: str) -> RecipeData | None:
+    '''Extracts recipe fields from the contents of a JSON-LD script'''
+    # Skip loading scripts that can't hold a recipe
+    if 'Recipe' not in text:
+        return None
+    try:
+        return recipe_data_from_json(srsly.json_loads(text))
+    except ValueError:
+        return None
+
+def find_recipe_data(page: str) -> RecipeData | None:
+    '''Finds the recipe fields in a page's JSON-LD scripts, if any'''
+    for match in _script_re.finditer(page):
+        data = recipe_data_from_script(match.group(1))
+        if data is not None:
+            return data
+    return None
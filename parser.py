@@ -1,56 +1,45 @@
 '''Recipe parsing and extraction classes and functions.'''
 
+import jsonld
 import re
 import recipe as r
 import requests
 import util as u
 
+from answers import StepAnswers
+from collections.abc import Iterable
+from contextlib import closing
+from fetcher import Fetcher, default_fetcher
 from html.parser import HTMLParser
+from recipe_cache import RecipeCache
 from nltk.tokenize import sent_tokenize
 
+#############
+# VARIABLES #
+#############
+
+PIPE_BATCH_SIZE = 64
+'''Number of step texts SpaCy processes per batch'''
+
+PIPE_N_PROCESS = 1
+'''Number of processes SpaCy uses to parse step texts'''
+
+STREAM_CHUNK_SIZE = 16 * 1024
+'''Number of bytes read at a time when streaming a recipe page'''
+
 ####################
 # HELPER FUNCTIONS #
 ####################
 
+def is_jsonld_script(attrs: list[tuple[str, str | None]]) -> bool:
+    '''Checks whether a script tag's attributes mark it as JSON-LD'''
+    return any(name == 'type' and value and
+               value.strip().lower().startswith('application/ld+json')
+               for (name, value) in attrs)
+
 def find_ingredient(name: str, ingredients: list[r.Ingredient]) -> list[int]:
     '''Finds the list of indices of the ingredients possibly being referenced'''
-
-    ingr_inds = []
-    components = name.split()
-
-    # Remove any determiners
-    if components[0] in ['the', 'a', 'an']:
-        del components[0]
-        name = ' '.join(components)
-
-    # If name is empty, return
-    if not name:
-        return ingr_inds
-    
-    # Initialize confidence to 1/2 of number of words
-    max_confidence = len(components) / 2
-
-    for i in range(len(ingredients)):
-        if name == ingredients[i].name:
-            # Return if an exact match
-            return [i]
-        elif name in ingredients[i].name:
-            # If a substring, add to list and limit search to other substrs
-            ingr_inds.append(i)
-            max_confidence = len(components) + 1
-        elif max_confidence <= len(components):
-            # Check how many words match and add to list if == current max or
-            # reset list to just it + update max if >
-            confidence = 0
-            for wd in components:
-                if wd in ingredients[i].name:
-                    confidence += 1
-            if confidence > max_confidence:
-                ingr_inds = [i]
-            elif confidence == max_confidence:
-                ingr_inds.append(i)
-    
-    return ingr_inds
+    return r.IngredientIndex(ingredients).find(name)
 
 def parse_nouns(step: r.Step, doc) -> None:
     '''Extract ingredients, tools, and temps from a SpaCy parse'''
@@ -89,91 +78,125 @@ def parse_nouns(step: r.Step, doc) -> None:
             # Check if the referenced noun is an ingredient.
             ref_ingr = r.Ingredient.from_str(name)
             if ref_ingr.name:
-                ingr_inds = find_ingredient(ref_ingr.name, step.state.remaining)
+                ledger = step.ledger
+                ingr_inds = ledger.find(ref_ingr.name)
                 # Assume ambiguous ingredient means inclusive
-                offset = 0
                 for i in ingr_inds:
+                    orig = ledger.ingredients[i]
                     ingr = r.Ingredient(
-                        ref_ingr.name if len(ingr_inds) == 1 \
-                            else step.state.remaining[i-offset].name,
+                        ref_ingr.name if len(ingr_inds) == 1 else orig.name,
                         ref_ingr.quantity if ref_ingr.quantity \
-                            else step.state.remaining[i-offset].quantity,
-                        ref_ingr.unit if ref_ingr.unit \
-                            else step.state.remaining[i-offset].unit)
-                    if ingr.quantity and \
-                        step.state.remaining[i-offset].quantity \
-                            <= ingr.quantity:
-                        del step.state.remaining[i-offset]
-                        offset += 1
-                    elif ingr.quantity:
-                        step.state.remaining[i-offset].quantity \
-                            -= ingr.quantity
+                            else ledger.quantity(i),
+                        ref_ingr.unit if ref_ingr.unit else orig.unit)
+                    ledger.consume(i, ingr.quantity)
                     step.ingredients.append(ingr)
 
-def parse_and_add_step(instr: str, recipe: r.Recipe) -> None:
-    '''Parses an instruction into maybe more steps and adds to recipe.'''
+def split_instruction(instr: str) -> list[str]:
+    '''Splits an instruction into formatted step texts.'''
 
     # Split recipe instruction into "sentences" for SpaCy parser
     sents = sent_tokenize(instr)
-    steps = []
+    texts = []
     for sent in sents:
-        steps.extend(re.split(r'(?:;|, then)\s+', sent))
+        for text in re.split(r'(?:;|, then)\s+', sent):
+            text = text.strip()
 
-    for text in steps:
-        text = text.strip()
+            # Skip if empty
+            if not text:
+                continue
 
-        # Skip if empty
-        if not text:
-            continue
+            # Form a nice sentence for the step text
+            text = ''.join([text[0].upper(), text[1:len(text)]])
+            if not text.endswith('.'):
+                text = ''.join([text, '.'])
+            texts.append(text)
+    return texts
 
-        # Form a nice sentence for the step text, and initialize step
-        text = ''.join([text[0].upper(), text[1:len(text)]])
-        if not text.endswith('.'):
-            text = ''.join([text, '.'])
-        if len(recipe.steps) > 0:
-            step: r.Step = r.Step(text, recipe.steps[-1].state)
-        else:
-            step: r.Step = r.Step(text, r.IngredientState(recipe.ingredients))
-
-        # Uncapitalize the first letter. This prevents SpaCy from reading the
-        # first word as a proper noun (imperative sentences are less common in
-        # its dataset).
-        text = ''.join([text[0].lower(), text[1:len(text)]])
-
-        # Based on the dependency + part of speech tagging, extract necessary
-        # information.
-        doc = u.nlp(text)
-        for (i, token) in enumerate(doc):
-
-            # If the parser interpreted an imperative sentence as an NP,
-            # correct it.
-            if token.dep_ == 'ROOT' and token.head.pos_ == 'NOUN':
-                for j in range(i,-1,-1):
-                    if j == 0 or \
-                        (j > 0 and doc[j-1].dep_ == 'punct'):
-                        doc[j].dep_ = 'ROOT'
-                        token.dep_ = 'dobj'
-                        step.methods.append(doc[j].text)
-                        break
-
-            # Extract methods
-            if token.dep_ == 'ROOT':
-                step.methods.append(token.text)
-            elif token.dep_ == 'conj':
-                if token.head.text in step.methods:
-                    step.methods.append(token.text)
-
-        # Extract ingredients, tools, and temps
-        parse_nouns(step, doc)
-
-        # Extract times
-        for ent in doc.ents:
-            if ent.label_ == 'TIME' or ent.label_ == 'DATE':
-                step.times.append(ent.text)
+def parse_step(step: r.Step, doc) -> None:
+    '''Extracts step information from a SpaCy parse of its text.'''
+
+    # Based on the dependency + part of speech tagging, extract necessary
+    # information.
+    for (i, token) in enumerate(doc):
+
+        # If the parser interpreted an imperative sentence as an NP,
+        # correct it.
+        if token.dep_ == 'ROOT' and token.head.pos_ == 'NOUN':
+            for j in range(i,-1,-1):
+                if j == 0 or \
+                    (j > 0 and doc[j-1].dep_ == 'punct'):
+                    doc[j].dep_ = 'ROOT'
+                    token.dep_ = 'dobj'
+                    step.methods.append(u.intern_str(doc[j].text))
+                    break
+
+        # Extract methods
+        if token.dep_ == 'ROOT':
+            step.methods.append(u.intern_str(token.text))
+        elif token.dep_ == 'conj':
+            if token.head.text in step.methods:
+                step.methods.append(u.intern_str(token.text))
+
+    # Extract ingredients, tools, and temps
+    parse_nouns(step, doc)
+
+    # Extract times
+    for ent in doc.ents:
+        if ent.label_ == 'TIME' or ent.label_ == 'DATE':
+            step.times.append(ent.text)
+
+def parse_and_add_steps(instrs: list[str], recipe: r.Recipe,
+                        batch_size: int = PIPE_BATCH_SIZE,
+                        n_process: int = PIPE_N_PROCESS) -> None:
+    '''Parses instructions into steps in one batch and adds to recipe.'''
+
+    u.ensure_nltk_data()
+    texts = []
+    for instr in instrs:
+        texts.extend(split_instruction(instr))
+
+    # Uncapitalize the first letter. This prevents SpaCy from reading the
+    # first word as a proper noun (imperative sentences are less common in
+    # its dataset).
+    docs = u.nlp.pipe((''.join([text[0].lower(), text[1:len(text)]])
+                       for text in texts),
+                      batch_size=batch_size, n_process=n_process)
+
+    # Docs are yielded in order, so each step is recorded in the ledger after
+    # the one before it.
+    for (text, doc) in zip(texts, docs):
+        step: r.Step = r.Step(text, recipe.ledger)
+        parse_step(step, doc)
+        step.answers = StepAnswers(step, recipe.title)
 
         # Save step to recipe
         recipe.steps.append(step)
 
+    # Parsed recipes are kept around, but their index is only used here
+    recipe.ledger.release_index()
+
+def parse_and_add_step(instr: str, recipe: r.Recipe) -> None:
+    '''Parses an instruction into maybe more steps and adds to recipe.'''
+    parse_and_add_steps([instr], recipe)
+
+def build_recipe(data: jsonld.RecipeData,
+                 batch_size: int = PIPE_BATCH_SIZE,
+                 n_process: int = PIPE_N_PROCESS) -> r.Recipe:
+    '''Builds a recipe from the fields found in its structured data.'''
+
+    recipe = r.Recipe()
+    recipe.title = data.title
+    recipe.other = dict(data.other)
+    names = [u.standardize_units(name.strip(' \t\n,;.:()'))
+             for name in data.ingredients]
+    for ingr in r.Ingredient.from_list_strs(names):
+        if ingr.name:
+            recipe.ingredients.append(ingr)
+    parse_and_add_steps([u.standardize_units(text)
+                         for text in data.instructions],
+                        recipe, batch_size, n_process)
+    return recipe
+
 ################
 # PARSER CLASS #
 ################
@@ -181,19 +204,44 @@ def parse_and_add_step(instr: str, recipe: r.Recipe) -> None:
 class RecipeHTMLParser(HTMLParser):
     '''HTML parser that handles recipes'''
 
-    def __init__(self, source: u.RecipeSource, convert_charrefs: bool = True) -> None:
+    def __init__(self, source: u.RecipeSource, convert_charrefs: bool = True,
+                 batch_size: int = PIPE_BATCH_SIZE,
+                 n_process: int = PIPE_N_PROCESS) -> None:
         # Initialize class, setting recipe to empty
         self.source = source
+        self.batch_size = batch_size
+        self.n_process = n_process
+        self.instructions: list[str] = []
+        self.ingredient_names: list[tuple[r.Ingredient, str]] = []
+        self.ingredient_named = False
+        self.steps_tag: str | None = None
+        self.steps_depth = 0
+        self.steps_read = False
+        self.done = False
+        self.script: list[str] | None = None
+        self.structured: jsonld.RecipeData | None = None
         self.recipe = r.Recipe()
         self.current_tag = u.HTMLTag.UNKNOWN
         self.current_section = u.HTMLTag.UNKNOWN
         self.ingredient = r.Ingredient()
         self.text = ''
+        self.data: list[str] = []
         super().__init__(convert_charrefs=convert_charrefs)
     
     def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
-        if tag in ['i','b','strong']:
+        # The rest of a fed chunk is still handled after the recipe is done
+        if self.done or tag in ['i','b','strong']:
+            return super().handle_starttag(tag, attrs)
+        self.flush_data()
+        # Collect JSON-LD scripts, which may hold the whole recipe
+        if tag == 'script' and is_jsonld_script(attrs):
+            self.script = []
+        # After the steps, only structured data can still change the recipe
+        if self.steps_read:
             return super().handle_starttag(tag, attrs)
+        # Track nesting within the steps section, to know when it closes
+        if tag == self.steps_tag:
+            self.steps_depth += 1
         # Save the current tag
         self.current_tag = u.HTMLTag.from_tag(self.source, tag, attrs)
         match self.current_tag:
@@ -202,20 +250,37 @@ class RecipeHTMLParser(HTMLParser):
             case u.HTMLTag.INGREDIENT:
                 if self.current_section == u.HTMLTag.INGREDIENTS_LIST:
                     self.ingredient = r.Ingredient()
-            case u.HTMLTag.INGREDIENT_QUANTITY:
-                if self.ingredient.name:
-                    self.ingredient = r.Ingredient()
-            case u.HTMLTag.INGREDIENT_NAME:
-                if self.ingredient.name:
+                    self.ingredient_named = False
+            case u.HTMLTag.INGREDIENT_QUANTITY | u.HTMLTag.INGREDIENT_NAME:
+                # A quantity or name after a name starts a new ingredient
+                if self.ingredient_named:
                     self.ingredient = r.Ingredient()
+                    self.ingredient_named = False
             case u.HTMLTag.STEPS_LIST:
                 self.current_section = u.HTMLTag.STEPS_LIST
+                self.steps_tag = tag
+                self.steps_depth = 0
             case u.HTMLTag.STEP:
                 self.text = ''
         return super().handle_starttag(tag, attrs)
     
     def handle_data(self, data: str) -> None:
-        # Handle text between tags as appropriate
+        if self.done:
+            return super().handle_data(data)
+        if self.script is not None:
+            self.script.append(data)
+        elif self.current_tag != u.HTMLTag.UNKNOWN:
+            # Text may arrive in pieces, e.g. split across streamed chunks,
+            # so it is handled once the next tag starts or ends
+            self.data.append(data)
+        return super().handle_data(data)
+
+    def flush_data(self) -> None:
+        '''Handles the text collected since the last tag as appropriate'''
+        if not self.data:
+            return
+        data = ''.join(self.data)
+        self.data = []
         match self.current_tag:
             case u.HTMLTag.TITLE:
                 self.recipe.title = data.strip()
@@ -228,38 +293,130 @@ class RecipeHTMLParser(HTMLParser):
                     self.ingredient.quantity = u.str_to_fraction(data.strip())
             case u.HTMLTag.INGREDIENT_UNIT:
                 if self.current_section == u.HTMLTag.INGREDIENTS_LIST:
-                    self.ingredient.unit = u.standardize_units(data.strip())
+                    self.ingredient.unit = u.intern_str(
+                        u.standardize_units(data.strip()))
             case u.HTMLTag.INGREDIENT_NAME:
                 if self.current_section == u.HTMLTag.INGREDIENTS_LIST:
-                    ingr = r.Ingredient.from_str(
-                        u.standardize_units(data.strip(' \t\n,;.:()')), True)
-                    if not self.ingredient.quantity:
-                        self.ingredient.quantity = ingr.quantity
-                    if not self.ingredient.unit:
-                        self.ingredient.unit = ingr.unit
-                    if ingr.name:
-                        self.ingredient.name = ingr.name
-                        self.recipe.ingredients.append(self.ingredient)
+                    name = u.standardize_units(data.strip(' \t\n,;.:()'))
+                    if name:
+                        # Names are parsed together once the page is done
+                        self.ingredient_names.append((self.ingredient, name))
+                        self.ingredient_named = True
             case u.HTMLTag.STEP:
                 if self.current_section == u.HTMLTag.STEPS_LIST:
                     self.text = ' '.join([self.text, data.strip()])
-        return super().handle_data(data)
 
     def handle_endtag(self, tag: str) -> None:
-        if tag in ['i','b','strong']:
+        if self.done or tag in ['i','b','strong']:
+            return super().handle_endtag(tag)
+        self.flush_data()
+        if tag == 'script' and self.script is not None:
+            # A recipe in structured data makes the rest of the page moot
+            if self.structured is None:
+                self.structured = jsonld.recipe_data_from_script(
+                    ''.join(self.script))
+                if self.structured is not None:
+                    self.done = True
+            self.script = None
+        if self.steps_read:
             return super().handle_endtag(tag)
         if self.current_tag == u.HTMLTag.STEP:
-            parse_and_add_step(u.standardize_units(self.text), self.recipe)
+            # Steps are parsed together once the page is done
+            self.instructions.append(u.standardize_units(self.text))
+        # Once the steps section closes, only JSON-LD scripts still matter
+        if tag == self.steps_tag:
+            if self.steps_depth == 0:
+                self.steps_read = True
+                self.current_section = u.HTMLTag.UNKNOWN
+            self.steps_depth -= 1
         # Reset tag
         self.current_tag = u.HTMLTag.UNKNOWN
         return super().handle_endtag(tag)
 
-################
-# API FUNCTION #
-################
+    def feed_stream(self, chunks: Iterable[str]) -> None:
+        '''Feeds chunks of a page until the rest of it can't change the
+        recipe'''
+        for chunk in chunks:
+            self.feed(chunk)
+            if self.done:
+                break
+
+    def add_ingredients(self) -> None:
+        '''Parses all collected ingredient names in one batch'''
+        ingrs = r.Ingredient.from_list_strs(
+            [name for (_, name) in self.ingredient_names])
+        for ((ingredient, _), ingr) in zip(self.ingredient_names, ingrs):
+            if not ingredient.quantity:
+                ingredient.quantity = ingr.quantity
+            if not ingredient.unit:
+                ingredient.unit = ingr.unit
+            if ingr.name:
+                ingredient.name = ingr.name
+                self.recipe.ingredients.append(ingredient)
+        self.ingredient_names = []
+
+    def close(self) -> None:
+        super().close()
+        self.flush_data()
+        if self.structured is not None:
+            # Prefer the structured data over the scraped tags
+            self.recipe = build_recipe(self.structured, self.batch_size,
+                                       self.n_process)
+            return
+        self.add_ingredients()
+        # Parse all collected steps in one batch
+        parse_and_add_steps(self.instructions, self.recipe,
+                            self.batch_size, self.n_process)
+        self.instructions = []
+
+#################
+# API FUNCTIONS #
+#################
+
+def normalize_url(url: str) -> str:
+    '''Adds the HTTPS scheme and www. subdomain to a recipe URL if missing'''
+    if not re.match(r'https://www\.', url):
+        if re.match(r'www\.', url):
+            url = ''.join(['https://', url])
+        else:
+            url = ''.join(['https://www.', url])
+    return url
+
+def find_page_url(html: str) -> str | None:
+    '''Finds the canonical URL of a saved page, if it declares one'''
+    match = re.search(r'<link[^>]*rel="canonical"[^>]*href="([^"]+)"', html) \
+        or re.search(r'<meta[^>]*property="og:url"[^>]*content="([^"]+)"',
+                     html)
+    return match.group(1) if match else None
 
-def get_recipe_from_url(url: str) -> r.Recipe | None:
-    '''Retrieves the text of a recipe from a given URL'''
+def parse_recipe_html(html: str, source: u.RecipeSource) -> r.Recipe:
+    '''Parses a recipe from the full HTML of its page, from its JSON-LD
+    structured data if it has any'''
+    data = jsonld.find_recipe_data(html)
+    if data is not None:
+        return build_recipe(data)
+    parser = RecipeHTMLParser(source)
+    parser.feed(html)
+    parser.close()
+    return parser.recipe
+
+def parse_recipe_stream(chunks: Iterable[str],
+                        source: u.RecipeSource) -> r.Recipe:
+    '''Parses a recipe from chunks of its page, stopping as soon as a
+    JSON-LD recipe has been read. Past the steps section, only JSON-LD
+    scripts are looked at, so a page without one is read to the end but
+    gives the same recipe as parse_recipe_html.'''
+    parser = RecipeHTMLParser(source)
+    parser.feed_stream(chunks)
+    parser.close()
+    return parser.recipe
+
+def get_recipe_from_url(url: str, fetcher: Fetcher | None = None,
+                        cache: RecipeCache | None = None,
+                        stream: bool = True) -> r.Recipe | None:
+    '''Retrieves the text of a recipe from a given URL, using the cache of
+    parsed recipes if given. If streaming, the download stops once the
+    recipe's JSON-LD structured data has been read.'''
 
     # Find recipe source; return None if unsupported
     source = u.RecipeSource.from_url(url)
@@ -267,14 +424,26 @@ def get_recipe_from_url(url: str) -> r.Recipe | None:
         return None
 
     # Add appropriate HTTPS tag if not there
-    if not re.match(r'https://www\.', url):
-        if re.match(r'www\.', url):
-            url = ''.join(['https://', url])
+    url = normalize_url(url)
+
+    # Return the cached recipe, if there is one
+    if cache is not None:
+        recipe = cache.get(url)
+        if recipe is not None:
+            return recipe
+
+    # Get the recipe from the page; return None if it can't be fetched
+    fetcher = fetcher or default_fetcher()
+    try:
+        if stream:
+            with closing(fetcher.iter_text(url, STREAM_CHUNK_SIZE)) as chunks:
+                recipe = parse_recipe_stream(chunks, source)
         else:
-            url = ''.join(['https://www.', url])
-    
-    # Get the recipe from the page
-    with requests.get(url) as f:
-        parser = RecipeHTMLParser(source)
-        parser.feed(f.text)
-        return parser.recipe
+            recipe = parse_recipe_html(fetcher.fetch(url), source)
+    except requests.RequestException:
+        return None
+
+    # Only cache recipes that were actually found on the page
+    if cache is not None and recipe.steps:
+        cache.put(url, recipe)
+    return recipe
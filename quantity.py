@@ -0,0 +1,94 @@
+'''Parsing of ingredient quantities, e.g. 1 1/2, 1½, 2-3, or 0.5'''
+
+import re
+import unicodedata
+
+from fractions import Fraction
+from functools import lru_cache
+
+#############
+# VARIABLES #
+#############
+
+QUANTITY_CACHE_SIZE = 4096
+'''Number of parsed strings remembered'''
+
+vulgar_fractions = {ch: Fraction(unicodedata.normalize('NFKD', ch)
+                                 .replace('⁄', '/'))
+                    for ch in '¼½¾⅐⅑⅒⅓⅔⅕⅖⅗⅘⅙⅚⅛⅜⅝⅞'}
+'''Value of each unicode vulgar fraction character'''
+
+_slash_table = str.maketrans({'⁄': '/', '∕': '/'})
+
+_number = r'(?:\d+(?:\.\d*)?|\.\d+)(?:e[-+]?\d+)?'
+
+_token_re = re.compile(rf'''
+    (?P<sign>[-+]?)
+    (?:
+        (?P<whole>\d+)?(?P<vulgar>[{''.join(vulgar_fractions)}])
+      | (?P<num>\d+)/(?P<den>\d+)
+      | (?P<low>{_number})[-–—](?P<high>{_number})
+      | (?P<number>{_number})
+    )''', re.VERBOSE | re.IGNORECASE)
+
+_maybe_quantity_re = re.compile(rf'[\d{"".join(vulgar_fractions)}]'
+                                r'|[^\x00-\x7f]')
+
+#############
+# FUNCTIONS #
+#############
+
+def _parse_token(token: str) -> Fraction | None:
+    match = _token_re.fullmatch(token)
+    if not match:
+        return None
+    if match['vulgar']:
+        value = vulgar_fractions[match['vulgar']]
+        if match['whole']:
+            value += int(match['whole'])
+    elif match['num']:
+        if int(match['den']) == 0:
+            return None
+        value = Fraction(int(match['num']), int(match['den']))
+    elif match['low']:
+        # Ranges, e.g. 2-3, count as their lower bound
+        value = Fraction(match['low'])
+    else:
+        value = Fraction(match['number'])
+    return -value if match['sign'] == '-' else value
+
+@lru_cache(maxsize=QUANTITY_CACHE_SIZE)
+def parse_token(token: str) -> Fraction | None:
+    '''Parses one whitespace-free token as a quantity, or returns None'''
+    if token.isascii():
+        return _parse_token(token)
+    match = _token_re.fullmatch(token)
+    if match and match['vulgar']:
+        return _parse_token(token)
+    # Other unicode forms (e.g. 1¹⁄₂ or 1 written before 1⁄2) become plain
+    # digits when normalized, with the whole number glued onto the numerator
+    value = _parse_token(unicodedata.normalize('NFKD', token)
+                         .translate(_slash_table))
+    if value is not None and value.denominator > 1 and value.numerator > 10:
+        value = Fraction(value.numerator % 10 +
+                         value.numerator // 10 * value.denominator,
+                         value.denominator)
+    return value
+
+@lru_cache(maxsize=QUANTITY_CACHE_SIZE)
+def parse_quantity(text: str) -> Fraction:
+    '''Sums the quantities in a string, e.g. 1 1/2 is 3/2. Words that are not
+    quantities are ignored, so a string without any is 0.'''
+    total = Fraction()
+    for token in text.split():
+        value = parse_token(token)
+        if value is not None:
+            total += value
+    return total
+
+def is_quantity(text: str) -> bool:
+    '''Checks whether a string holds a nonzero quantity'''
+    # Most words have no digits and can be rejected without parsing
+    if not _maybe_quantity_re.search(text):
+        return False
+    return parse_quantity(text) != 0
@@ -1,12 +1,25 @@
 '''Recipe data representations.'''
 
-from copy import deepcopy
+import srsly
+
+from answers import StepAnswers
 from fractions import Fraction
-from util import nlp, NounType, str_to_fraction
+from util import intern_str, is_quantity, nlp, NounType, str_to_fraction
+
+FORMAT_VERSION = 2
+'''Version of the serialized recipe format'''
+
+def _fraction_to_data(frac: Fraction | None) -> list[int] | None:
+    return None if frac is None else [frac.numerator, frac.denominator]
+
+def _fraction_from_data(data: list[int] | None) -> Fraction | None:
+    return None if data is None else Fraction(data[0], data[1])
 
 class Ingredient:
     '''Struct holding ingredient information'''
 
+    __slots__ = ('name', 'quantity', 'unit')
+
     def __init__(self, name: str | None = None,
                  quantity: Fraction | None = None,
                  unit: str | None = None):
@@ -14,39 +27,65 @@ class Ingredient:
         '''Name of the ingredient, e.g. salt'''
         self.quantity = quantity
         '''Quantity of the ingredient, e.g. 1/2'''
-        self.unit = unit
+        self.unit = intern_str(unit)
         '''Unit of the ingredient, e.g. tsp'''
+
+    def to_dict(self) -> dict:
+        '''Converts the ingredient to JSON/msgpack-serializable data'''
+        return {'name': self.name,
+                'quantity': _fraction_to_data(self.quantity),
+                'unit': self.unit}
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        '''Creates an ingredient from the output of to_dict'''
+        return Ingredient(data['name'], _fraction_from_data(data['quantity']),
+                          data['unit'])
     
     @classmethod
-    def from_str(cls, name: str, in_list: bool = False):
+    def __from_list_doc(cls, name: str, doc):
         ingr = Ingredient()
-        doc = nlp(name)
-        if in_list:
-            # Find quantity, if available
+
+        # Find quantity, if available
+        i = 0
+        li = 0
+        quantity = []
+        while i < len(doc) and is_quantity(doc[i].text):
+            quantity.append(doc[i].text)
+            li += len(doc[i].text) + 1
+            i += 1
+        if quantity:
+            ingr.quantity = str_to_fraction(' '.join(quantity))
+        else:
             i = 0
-            li = 0
-            quantity = []
-            while i < len(doc) and str_to_fraction(doc[i].text) != Fraction():
-                quantity.append(doc[i].text)
-                li += len(doc[i].text) + 1
-                i += 1
-            if quantity:
-                ingr.quantity = str_to_fraction(' '.join(quantity))
-            else:
-                i = 0
 
-            # Find unit, if available
-            if i < len(doc) and \
-                NounType.MEASURE in NounType.from_str(doc[i].text):
-                ingr.unit = doc[i].text
-                li += len(doc[i].text) + 1
-                i += 1
-            
-            # Find name
-            ingr.name = name[li:]
+        # Find unit, if available
+        if i < len(doc) and \
+            NounType.MEASURE in NounType.from_str(doc[i].text):
+            ingr.unit = intern_str(doc[i].text)
+            li += len(doc[i].text) + 1
+            i += 1
+
+        # Find name
+        ingr.name = name[li:]
+
+        return ingr
+
+    @classmethod
+    def from_list_strs(cls, names: list[str]):
+        '''Parses ingredient list entries in one batch, tokenizing only'''
+        return [Ingredient.__from_list_doc(name, doc)
+                for (name, doc) in zip(names, nlp.tokenizer.pipe(names))]
+
+    @classmethod
+    def from_str(cls, name: str, in_list: bool = False):
+        if in_list:
+            # Ingredient list entries only need tokens, not a full parse
+            return Ingredient.__from_list_doc(name, nlp.make_doc(name))
+
+        ingr = Ingredient()
+        doc = nlp(name)
 
-            return ingr
-        
         for chunk in doc.noun_chunks:
 
             # Find quantity, if available
@@ -75,7 +114,7 @@ class Ingredient:
             # Find unit, if available
             if i < chunk.end and \
                 NounType.MEASURE in NounType.from_str(doc[i].text):
-                ingr.unit = doc[i].text
+                ingr.unit = intern_str(doc[i].text)
                 li += len(doc[i].text) + 1
                 i += 1
             
@@ -94,35 +133,217 @@ class Ingredient:
 class IntermediateIngredient:
     '''Struct holding intermediate ingredient information, e.g. dough'''
 
+    __slots__ = ('name', 'ingredients')
+
     def __init__(self, ingredients: list[Ingredient]):
         self.name: str | None = None
         '''Name of the intermediate ingredient, if assigned, e.g. dough'''
         self.ingredients = ingredients
         '''Original ingredients involved, e.g. [flour, eggs]'''
 
+    def to_dict(self) -> dict:
+        '''Converts the intermediate ingredient to serializable data'''
+        return {'name': self.name,
+                'ingredients': [ingr.to_dict() for ingr in self.ingredients]}
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        '''Creates an intermediate ingredient from the output of to_dict'''
+        inter = IntermediateIngredient(
+            [Ingredient.from_dict(ingr) for ingr in data['ingredients']])
+        inter.name = data['name']
+        return inter
+
 class IngredientState:
-    '''Struct holding the current state of ingredients at a given step'''
+    '''Struct holding the state of ingredients at a given step'''
+
+    __slots__ = ('remaining', 'intermediate', 'focus')
 
     def __init__(self, remaining: list[Ingredient],
-                 intermediate: list[IntermediateIngredient] = [],
+                 intermediate: list[IntermediateIngredient] | None = None,
                  focus: int = -1):
-        self.remaining: list[Ingredient] = deepcopy(remaining)
+        self.remaining: list[Ingredient] = remaining
         '''Remaining unused ingredients'''
-        self.intermediate: list[IntermediateIngredient] = deepcopy(intermediate)
+        self.intermediate: list[IntermediateIngredient] = intermediate or []
         '''Any intermediate collections of ingredients'''
         self.focus = focus
         '''Index of currently referenced intermediate ingredient'''
 
+class IngredientIndex:
+    '''Index of ingredient names for resolving references to ingredients'''
+
+    __slots__ = ('names', 'exact', 'postings', 'active')
+
+    def __init__(self, ingredients: list[Ingredient]):
+        self.names: list[str] = [ingr.name or '' for ingr in ingredients]
+        '''Name of each ingredient'''
+        self.exact: dict[str, list[int]] = {}
+        '''Indices of the ingredients with each exact name'''
+        self.postings: dict[str, frozenset[int]] = {}
+        '''Indices of the ingredients whose names contain each word, filled
+        in for the words of all names up front and for others when first
+        looked up'''
+        self.active: set[int] = set(range(len(ingredients)))
+        '''Indices of the ingredients that can still be referenced'''
+        for (i, name) in enumerate(self.names):
+            self.exact.setdefault(name, []).append(i)
+            for word in name.split():
+                self.containing(word)
+
+    def containing(self, text: str) -> frozenset[int]:
+        '''Indices of all ingredients whose names contain text'''
+        inds = self.postings.get(text)
+        if inds is None:
+            inds = frozenset(i for (i, name) in enumerate(self.names)
+                             if text in name)
+            self.postings[text] = inds
+        return inds
+
+    def discard(self, ind: int) -> None:
+        '''Stops an ingredient (e.g. one used up) from being referenced'''
+        self.active.discard(ind)
+
+    def find(self, name: str) -> list[int]:
+        '''Finds the indices of the ingredients possibly being referenced'''
+        components = name.split()
+
+        # Remove any determiners
+        if components and components[0] in ['the', 'a', 'an']:
+            del components[0]
+            name = ' '.join(components)
+
+        # If name is empty, return
+        if not name:
+            return []
+
+        # Return the first exact match, if any
+        for i in self.exact.get(name, []):
+            if i in self.active:
+                return [i]
+
+        # Names containing the reference are all possible matches
+        substrs = sorted(self.containing(name) & self.active)
+
+        # Before the first of those, also match the names containing the most
+        # words of the reference, if that is at least half of them. As each
+        # ingredient is scanned in order, any containing more than half the
+        # words restarts the list and any containing exactly half joins it.
+        first = substrs[0] if substrs else len(self.names)
+        confidence: dict[int, int] = {}
+        for wd in components:
+            for i in self.containing(wd):
+                if i < first and i in self.active:
+                    confidence[i] = confidence.get(i, 0) + 1
+        min_confidence = len(components) / 2
+        ingr_inds = []
+        for i in sorted(confidence):
+            if confidence[i] > min_confidence:
+                ingr_inds = [i]
+            elif confidence[i] == min_confidence:
+                ingr_inds.append(i)
+
+        return ingr_inds + substrs
+
+class IngredientLedger:
+    '''Record of the ingredients consumed by each step, from which the state
+    of the ingredients at any step is reconstructed'''
+
+    __slots__ = ('ingredients', 'deltas', 'quantities', 'index')
+
+    def __init__(self, ingredients: list[Ingredient]):
+        self.ingredients = ingredients
+        '''The recipe's ingredients, which are never modified'''
+        self.deltas: list[list[tuple[int, Fraction]]] = []
+        '''Ingredients consumed by each step, as (index in ingredients,
+        quantity consumed)'''
+        self.quantities: dict[int, Fraction | None] = {}
+        '''Remaining quantity of each remaining ingredient after the latest
+        step, by index in ingredients'''
+        self.index: IngredientIndex | None = None
+        '''Index of the ingredients remaining after the latest step, built
+        when first needed and released once the steps are parsed'''
+
+    @staticmethod
+    def __apply(quantities: dict[int, Fraction | None], ind: int,
+                quantity: Fraction) -> None:
+        if ind not in quantities:
+            return
+        remaining = quantities[ind]
+        if remaining is None or remaining <= quantity:
+            del quantities[ind]
+        else:
+            quantities[ind] = remaining - quantity
+
+    def add_step(self) -> int:
+        '''Starts recording a new step, returning its index'''
+        if not self.deltas:
+            self.quantities = {i: ingr.quantity
+                               for (i, ingr) in enumerate(self.ingredients)}
+        self.deltas.append([])
+        return len(self.deltas) - 1
+
+    def find(self, name: str) -> list[int]:
+        '''Finds the indices of the remaining ingredients possibly being
+        referenced'''
+        if self.index is None:
+            self.index = IngredientIndex(self.ingredients)
+            self.index.active = set(self.quantities)
+        return self.index.find(name)
+
+    def release_index(self) -> None:
+        '''Drops the ingredient index, which only parsing needs'''
+        self.index = None
+
+    def remaining(self) -> list[int]:
+        '''Indices of the ingredients remaining after the latest step'''
+        return list(self.quantities)
+
+    def quantity(self, ind: int) -> Fraction | None:
+        '''Remaining quantity of an ingredient after the latest step'''
+        return self.quantities.get(ind)
+
+    def consume(self, ind: int, quantity: Fraction | None) -> None:
+        '''Records the latest step using some quantity of an ingredient,
+        removing it once all of it is used'''
+        if not quantity:
+            return
+        self.deltas[-1].append((ind, quantity))
+        IngredientLedger.__apply(self.quantities, ind, quantity)
+        if self.index is not None and ind not in self.quantities:
+            self.index.discard(ind)
+
+    def state(self, step: int) -> IngredientState:
+        '''Reconstructs the state of the ingredients after a given step'''
+        quantities = {i: ingr.quantity
+                      for (i, ingr) in enumerate(self.ingredients)}
+        for delta in self.deltas[:step + 1]:
+            for (ind, quantity) in delta:
+                IngredientLedger.__apply(quantities, ind, quantity)
+
+        # Unchanged ingredients are shared rather than copied
+        remaining = []
+        for (ind, quantity) in quantities.items():
+            ingr = self.ingredients[ind]
+            if quantity != ingr.quantity:
+                ingr = Ingredient(ingr.name, quantity, ingr.unit)
+            remaining.append(ingr)
+        return IngredientState(remaining)
+
 class Step:
     '''Struct holding step information'''
 
-    def __init__(self, text: str, init_state: IngredientState):
+    __slots__ = ('text', 'ingredients', 'ledger', 'index', 'tools',
+                 'methods', 'times', 'temps', 'answers')
+
+    def __init__(self, text: str, ledger: IngredientLedger):
         self.text: str = text
         '''Text associated with the step'''
         self.ingredients: list[Ingredient] = []
         '''List of ingredients used in this step'''
-        self.state: IngredientState = init_state
-        '''State of the ingredients at this step'''
+        self.ledger: IngredientLedger = ledger
+        '''Ledger recording the ingredients used by the recipe's steps'''
+        self.index: int = ledger.add_step()
+        '''Index of this step in the ledger'''
         self.tools: list[str] = []
         '''Tools mentioned in this step'''
         self.methods: list[str] = []
@@ -131,18 +352,93 @@ class Step:
         '''Times mentioned in this step'''
         self.temps: list[str] = []
         '''Temperatures / measures of "doneness" mentioned in this step'''
-    
+        self.answers: StepAnswers | None = None
+        '''Prepared answers to questions about this step, once parsed'''
+
+    @property
+    def state(self) -> IngredientState:
+        '''State of the ingredients after this step'''
+        return self.ledger.state(self.index)
+
+    def to_dict(self) -> dict:
+        '''Converts the step to serializable data, storing the ingredients
+        it consumed as [index in the recipe's ingredients, quantity]'''
+        return {'text': self.text,
+                'ingredients': [ingr.to_dict() for ingr in self.ingredients],
+                'consumed': [[ind, _fraction_to_data(quantity)] for
+                             (ind, quantity) in self.ledger.deltas[self.index]],
+                'tools': self.tools,
+                'methods': self.methods,
+                'times': self.times,
+                'temps': self.temps}
+
+    @classmethod
+    def from_dict(cls, data: dict, ledger: IngredientLedger):
+        '''Creates a step from the output of to_dict, as the ledger's next
+        step'''
+        step = Step(data['text'], ledger)
+        step.ingredients = [Ingredient.from_dict(ingr)
+                            for ingr in data['ingredients']]
+        for (ind, quantity) in data['consumed']:
+            ledger.consume(ind, _fraction_from_data(quantity))
+        step.tools = data['tools']
+        step.methods = [intern_str(method) for method in data['methods']]
+        step.times = data['times']
+        step.temps = data['temps']
+        return step
+
 class Recipe:
     '''Struct holding recipe information'''
 
+    __slots__ = ('title', 'ingredients', 'ledger', 'tools', 'steps', 'other')
+
     def __init__(self):
         self.title: str = ""
         '''Title of the recipe'''
         self.ingredients: list[Ingredient] = []
         '''List of ingredients used in the recipe'''
+        self.ledger: IngredientLedger = IngredientLedger(self.ingredients)
+        '''Ledger recording the ingredients used by each step'''
         self.tools: list[str] = []
         '''List of tools used in the recipe'''
         self.steps: list[Step] = []
         '''List of recipe steps'''
         self.other: dict[str, str] = {}
         '''Other miscellaneous recipe information'''
+
+    def to_dict(self) -> dict:
+        '''Converts the recipe to JSON/msgpack-serializable data'''
+        return {'version': FORMAT_VERSION,
+                'title': self.title,
+                'ingredients': [ingr.to_dict() for ingr in self.ingredients],
+                'tools': self.tools,
+                'steps': [step.to_dict() for step in self.steps],
+                'other': self.other}
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        '''Creates a recipe from the output of to_dict'''
+        if data.get('version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported recipe format version: "
+                             f"{data.get('version')}")
+        recipe = Recipe()
+        recipe.title = data['title']
+        recipe.ingredients.extend(Ingredient.from_dict(ingr)
+                                  for ingr in data['ingredients'])
+        recipe.tools = data['tools']
+        recipe.steps = [Step.from_dict(step, recipe.ledger)
+                        for step in data['steps']]
+        # Answers are derived from the rest, so are rebuilt rather than stored
+        for step in recipe.steps:
+            step.answers = StepAnswers(step, recipe.title)
+        recipe.other = data['other']
+        return recipe
+
+    def to_bytes(self) -> bytes:
+        '''Encodes the recipe compactly as msgpack'''
+        return srsly.msgpack_dumps(self.to_dict())
+
+    @classmethod
+    def from_bytes(cls, data: bytes):
+        '''Decodes a recipe from the output of to_bytes'''
+        return Recipe.from_dict(srsly.msgpack_loads(data))
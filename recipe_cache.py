@@ -0,0 +1,142 @@
+'''Persistent on-disk cache of parsed recipes, keyed by URL.'''
+
+import os
+import recipe as r
+import sqlite3
+import threading
+import time
+
+from functools import lru_cache
+
+#############
+# VARIABLES #
+#############
+
+CACHE_PATH = os.environ.get(
+    'RECIPE_CACHE_PATH',
+    os.path.join(os.path.expanduser('~'), '.cache', 'recipe_chatbox',
+                 'recipes.sqlite3'))
+'''Location of the recipe cache database'''
+
+CACHE_TTL = 7 * 24 * 60 * 60
+'''Seconds a cached recipe stays valid'''
+
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+'''Total size of cached recipes before the least recently used are evicted'''
+
+###############
+# CACHE CLASS #
+###############
+
+class RecipeCache:
+    '''SQLite-backed store of parsed recipes with a TTL and LRU eviction'''
+
+    def __init__(self, path: str = CACHE_PATH, ttl: float = CACHE_TTL,
+                 max_bytes: int = CACHE_MAX_BYTES) -> None:
+        self.path = path
+        '''Location of the database, or ':memory:' '''
+        self.ttl = ttl
+        '''Seconds a cached recipe stays valid'''
+        self.max_bytes = max_bytes
+        '''Total size of cached recipes to keep'''
+        self.lock = threading.Lock()
+
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        with self.db:
+            self.db.execute('CREATE TABLE IF NOT EXISTS recipes ('
+                            'url TEXT PRIMARY KEY, data BLOB NOT NULL, '
+                            'size INTEGER NOT NULL, created REAL NOT NULL, '
+                            'accessed REAL NOT NULL)')
+            self.db.execute('CREATE INDEX IF NOT EXISTS recipes_accessed '
+                            'ON recipes (accessed)')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.db.execute('SELECT COUNT(*) FROM recipes') \
+                .fetchone()[0]
+
+    def close(self) -> None:
+        '''Closes the database connection'''
+        with self.lock:
+            self.db.close()
+
+    @staticmethod
+    def dumps(recipe: r.Recipe) -> bytes:
+        '''Serializes a recipe for storage'''
+        return recipe.to_bytes()
+
+    @staticmethod
+    def loads(data: bytes) -> r.Recipe:
+        '''Deserializes a stored recipe'''
+        return r.Recipe.from_bytes(data)
+
+    def get(self, url: str) -> r.Recipe | None:
+        '''Returns the cached recipe for a URL, or None if missing/expired'''
+        now = time.time()
+        with self.lock, self.db:
+            row = self.db.execute('SELECT data, created FROM recipes '
+                                  'WHERE url = ?', (url,)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl:
+                self.db.execute('DELETE FROM recipes WHERE url = ?', (url,))
+                return None
+            self.db.execute('UPDATE recipes SET accessed = ? WHERE url = ?',
+                            (now, url))
+        try:
+            return self.loads(row[0])
+        except Exception:
+            # Unreadable entries (e.g. from an older format) are dropped
+            self.discard(url)
+            return None
+
+    def put(self, url: str, recipe: r.Recipe) -> None:
+        '''Caches a recipe, evicting the least recently used if full'''
+        data = self.dumps(recipe)
+        now = time.time()
+        with self.lock, self.db:
+            self.db.execute('INSERT OR REPLACE INTO recipes '
+                            'VALUES (?, ?, ?, ?, ?)',
+                            (url, data, len(data), now, now))
+            self.__evict()
+
+    def discard(self, url: str) -> None:
+        '''Removes a URL from the cache, if present'''
+        with self.lock, self.db:
+            self.db.execute('DELETE FROM recipes WHERE url = ?', (url,))
+
+    def clear(self) -> None:
+        '''Removes every cached recipe'''
+        with self.lock, self.db:
+            self.db.execute('DELETE FROM recipes')
+
+    def __evict(self) -> None:
+        # Drop expired entries, then least recently used ones until the
+        # cache fits in max_bytes.
+        self.db.execute('DELETE FROM recipes WHERE created < ?',
+                        (time.time() - self.ttl,))
+        total = self.db.execute('SELECT COALESCE(SUM(size), 0) '
+                                'FROM recipes').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = []
+        for (url, size) in self.db.execute('SELECT url, size FROM recipes '
+                                           'ORDER BY accessed'):
+            if total <= self.max_bytes:
+                break
+            evicted.append((url,))
+            total -= size
+        self.db.executemany('DELETE FROM recipes WHERE url = ?', evicted)
+
+@lru_cache(maxsize=1)
+def default_cache() -> RecipeCache:
+    '''Returns the recipe cache shared by the whole process'''
+    return RecipeCache()
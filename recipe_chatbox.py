@@ -1,23 +1,61 @@
 '''The main chatbot'''
-import nltk
-nltk.download('punkt_tab')
 import re
+import time
 import util as u
 
+from answers import StepAnswers, generate_google_search_url, \
+    generate_youtube_search_url
+from collections import Counter, deque
+from functools import lru_cache
+from intent_classifier import default_classifier
 from nltk.corpus import wordnet as wn
-from parser import get_recipe_from_url
+from parser import get_recipe_from_url, normalize_url
+from recipe_cache import default_cache
 
 ###########
 # CONTEXT #
 ###########
 
+PROMPT_HISTORY = 64
+'''Number of recent prompts kept for each session'''
+
 class Context:
 
     def __init__(self):
 
-        self.user_prompts = []
+        self.user_prompts = deque(maxlen=PROMPT_HISTORY)
+        '''Most recent prompts, oldest first'''
         self.current_recipe = None
+        self.recipe_url = None
+        '''Normalized URL of the current recipe, its key in the cache'''
         self.current_step = 0
+        self.finished = False
+        '''Whether the user has ended the session'''
+        self.last_active = time.time()
+        '''Time of the last prompt'''
+
+    def to_dict(self) -> dict:
+        '''Converts the session to a dictionary, referring to the recipe by
+        its URL rather than including it'''
+        return {
+            'recipe_url': self.recipe_url,
+            'current_step': self.current_step,
+            'user_prompts': list(self.user_prompts),
+            'finished': self.finished,
+            'last_active': self.last_active
+        }
+
+    @staticmethod
+    def from_dict(data: dict) -> 'Context':
+        '''Restores a session from a dictionary. The recipe itself is left
+        for the caller to load from recipe_url.'''
+        context = Context()
+        context.recipe_url = data['recipe_url']
+        context.current_step = data['current_step']
+        context.user_prompts.extend(data['user_prompts'])
+        context.finished = data['finished']
+        context.last_active = data['last_active']
+        return context
 
 #####################
 # DISPLAY FUNCTIONS #
@@ -25,60 +63,55 @@ class Context:
 
 def display_step(context):
 
-    if context.current_step >= len(context.current_recipe.steps):
-        print("Sorry, we have gone through all the steps")
+    steps = context.current_recipe.steps
+    if context.current_step >= len(steps):
+        return "Sorry, we have gone through all the steps"
 
-    if context.current_step == len(context.current_recipe.steps) - 1:
-        step_text = f"Final Step: {context.current_recipe.steps[context.current_step]}"
+    if context.current_step == len(steps) - 1:
+        lines = [f"Final Step: {steps[context.current_step].text}"]
     else:
-        step_text = f"Step {context.current_step + 1}: {context.current_recipe.steps[context.current_step].text}"
-
-
-    print(step_text)
+        lines = [f"Step {context.current_step + 1}: {steps[context.current_step].text}"]
 
     context.current_step += 1
 
-
-    if context.current_step >= len(context.current_recipe.steps):
-        print("/n Do you have any questions regarding this final step?")
-        print(f"{shortcut_tip} or ask any other questions you have")
+    if context.current_step >= len(steps):
+        lines.append("\nDo you have any questions regarding this final step?")
     else:
-        print("Do you have any questions regarding this step?")
-        print(f"{shortcut_tip} or ask any other questions you have")
+        lines.append("Do you have any questions regarding this step?")
+    lines.append(f"{shortcut_tip} or ask any other questions you have")
+
+    return "\n".join(lines)
 
 def display_ingredients(context):
 
     recipe_title = context.current_recipe.title
     ingredients = context.current_recipe.ingredients
 
-
-
-
+    lines = []
     if ingredients:
-        print(f"The ingredients for '{recipe_title}' are as follows:")
+        lines.append(f"The ingredients for '{recipe_title}' are as follows:")
 
         for ingr in ingredients:
 
-            print(
-            '  • ',
-            u.fraction_to_str(ingr.quantity) if ingr.quantity else '',
-            ' ' if ingr.quantity else '',
-            ingr.unit if ingr.unit else '',
-            ' ' if ingr.unit else '',
-            ingr.name,
-            sep=''
-        )
+            lines.append(''.join([
+                '  • ',
+                u.fraction_to_str(ingr.quantity) if ingr.quantity else '',
+                ' ' if ingr.quantity else '',
+                ingr.unit if ingr.unit else '',
+                ' ' if ingr.unit else '',
+                ingr.name
+            ]))
 
     else:
-        print(f"Sorry, I could not obtain the ingredients")
+        lines.append(f"Sorry, I could not obtain the ingredients")
 
     if context.current_step > 0:
-        print("\nWould you like to go back to the steps, or do you have any other questions?")
-        print(f"{shortcut_tip} or ask any other questions you have")
-
+        lines.append("\nWould you like to go back to the steps, or do you have any other questions?")
     else:
-        print("\nWould you like to walk through the steps, or do you have any other questions?")
-        print(f"{shortcut_tip} or ask any other questions you have")
+        lines.append("\nWould you like to walk through the steps, or do you have any other questions?")
+    lines.append(f"{shortcut_tip} or ask any other questions you have")
+
+    return "\n".join(lines)
 
 shortcuts = {
     "shortcuts": "Display all avalable keyword shortcuts.",
@@ -90,26 +123,36 @@ shortcuts = {
 
 shortcut_tip = "Enter 'shortcuts' to view all available keyword shortcuts"
 
-def display_shortcuts():
-    print("Shortcuts:")
-    for shortcut in shortcuts:
-        print(f"  • '{shortcut}': {shortcuts[shortcut]}")
+url_request = "Please enter the URL of the recipe you need assistance with."
 
-##########################
-# SEARCH QUERY FORMATION #
-##########################
+not_understood = "Sorry, I didn't understand that."
 
-def generate_youtube_search_url(query):
+how_tip = f"{shortcut_tip} or ask any other questions you have."
 
-    base_url = "https://www.youtube.com/results?search_query="
-    formatted_query = query.replace(" ", "+")
-    return base_url + formatted_query
+small_talk_replies = {
+    "greet": f"Hello! {shortcut_tip} or ask any other questions you have",
+    "goodbye": "Enter 'quit' to end the Recipe Chatbox session.",
+    "thankyou": "You're welcome :)",
+    "how_to_get_started": f"{shortcut_tip} or ask any other questions you have"
+}
+
+def display_shortcuts():
+    lines = ["Shortcuts:"]
+    for shortcut in shortcuts:
+        lines.append(f"  • '{shortcut}': {shortcuts[shortcut]}")
+    return "\n".join(lines)
 
-def generate_google_search_url(query):
+################
+# STEP ANSWERS #
+################
 
-    base_url = "https://www.google.com/search?q="
-    formatted_query = query.replace(" ", "+")
-    return base_url + formatted_query
+def current_answers(context):
+    '''Returns the prepared answers about the current step'''
+
+    step = context.current_recipe.steps[context.current_step - 1]
+    if step.answers is None:
+        step.answers = StepAnswers(step, context.current_recipe.title)
+    return step.answers
 
 #################
 # INPUT PARSING #
@@ -125,42 +168,59 @@ def is_ambiguous(input_string):
 
     return bool(re.search(pattern, input_string, re.IGNORECASE))
 
-def contains_what(input_string):
-
-    pattern = r'\bwhat\b'
-    return bool(re.search(pattern, input_string, re.IGNORECASE))
-
-def contains_how(input_string):
-
-    pattern = r'\bhow\b'
-    return bool(re.search(pattern, input_string, re.IGNORECASE))
-
-def contains_ingredient(input_string):
-
-
-    pattern = r'\bingredients?\b'
-    return bool(re.search(pattern, input_string, re.IGNORECASE))
-
-def is_temperature_related(input_string):
-
-    pattern = r'\b(temperature|hot|cold|warm|cool|heat|degrees?|celsius|fahrenheit|temp|temps)\b'
-
-
-    return bool(re.search(pattern, input_string, re.IGNORECASE))
-
-def is_duration_related(prompt):
-
-    pattern = r'\b(how long|how many minutes?|time|duration|minutes?|hours?|seconds?|when)\b'
-
-    return bool(re.search(pattern, prompt, re.IGNORECASE))
-
-
-def is_amount_related(prompt):
-
-
-    pattern = r'\b(how much|amount|quantity|measure|measurement|portion|serving|use)\b'
-
-    return bool(re.search(pattern, prompt, re.IGNORECASE))
+intent_patterns = dict([
+    ('quit', r'\bquit\b|\bexit\b'
+             r'|\b(?:end|stop|leave)\b.*\b(?:session|program|script)\b'),
+    ('new', r'\Anew\Z|\b(?:new|another|different) recipe\b'),
+    ('ingredient', r'\bingredients?\b'),
+    ('temperature', r'\b(?:temperature|hot|cold|warm|cool|heat|degrees?'
+                    r'|celsius|fahrenheit|temp|temps)\b'),
+    ('amount', r'\b(?:how much|amount|quantity|measure|measurement|portion'
+               r'|serving|use)\b'),
+    ('duration', r'\b(?:how long|how many minutes?|time|duration|minutes?'
+                 r'|hours?|seconds?|when)\b'),
+    ('what', r'\bwhat\b'),
+    ('how', r'\bhow\b'),
+    ('thanks', r'\bthank(?:\b|s\b)|\bappreciate\b.*(?:you|help)'),
+])
+'''Keyword pattern of each intent, in order of priority'''
+
+session_intents = ('quit', 'new')
+'''Intents handled by the session loop rather than handle_input'''
+
+class IntentRouter:
+    '''Classifies a message by the first intent, in order of priority, whose
+    pattern it contains, using a single compiled regex'''
+
+    def __init__(self, patterns: dict[str, str],
+                 fallback: str = 'navigation'):
+
+        # Each alternative is a lookahead over the whole message, so the
+        # first intent in the table that matches anywhere wins
+        self.regex = re.compile(
+            '|'.join(f'(?=(?s:.*?)(?P<{intent}>{pattern}))'
+                     for intent, pattern in patterns.items()),
+            re.IGNORECASE)
+        '''Combined pattern with a named group per intent'''
+        self.fallback = fallback
+        '''Intent of messages that match no pattern'''
+        self.counts = Counter(dict.fromkeys([*patterns, fallback], 0))
+        '''Number of messages classified as each intent'''
+
+    def classify(self, text: str) -> str:
+        '''Returns the intent of a message'''
+        match = self.regex.match(text)
+        intent = match.lastgroup if match else self.fallback
+        self.counts[intent] += 1
+        return intent
+
+session_router = IntentRouter(intent_patterns)
+'''Router for messages in the session loop'''
+
+input_router = IntentRouter({intent: pattern
+                             for intent, pattern in intent_patterns.items()
+                             if intent not in session_intents})
+'''Router for messages passed to handle_input without an intent'''
 
 ##########################
 # INFORMATION EXTRACTION #
@@ -215,11 +275,11 @@ def extract_step_number(user_input):
 
 def repeat_step(context):
     context.current_step -= 1
-    display_step(context)
+    return display_step(context)
 
 def go_to_step(context, step):
     context.current_step =  step - 1
-    display_step(context)
+    return display_step(context)
 
 ###################
 # INTENT HANDLERS #
@@ -228,52 +288,11 @@ def go_to_step(context, step):
 def handle_what(context, input_text):
 
     if is_ambiguous(input_text):
+        links = current_answers(context).what
+        return f"{links}\n{shortcut_tip}" if links else shortcut_tip
 
-        current_step = context.current_recipe.steps[context.current_step - 1]
-        queries = []
-        result_strings = []
-
-
-        if isinstance(current_step.methods, list):
-            for method in current_step.methods:
-                if isinstance(method, str):
-                    query = f"{method} as a method of cooking"
-                    queries.append(query)
-                    result_strings.append(
-                        f"For more details about '{method}', visit: {generate_google_search_url(query)}"
-                    )
-
-
-        for ingr in current_step.ingredients:
-            if isinstance(ingr.name, str):
-                query = ingr.name
-                queries.append(query)
-                result_strings.append(
-                    f"For more details about '{ingr.name}', visit: {generate_google_search_url(query)}"
-                )
-
-
-        if isinstance(current_step.tools, list):
-            for tool in current_step.tools:
-                if isinstance(tool, str):
-                    queries.append(tool)
-                    result_strings.append(
-                        f"For more details about '{tool}', visit: {generate_google_search_url(tool)}"
-                    )
-
-
-    else:
-
-        query = input_text + " in the context of cooking"
-        result_strings = [
-            f"For more details, visit: {generate_google_search_url(query)}"
-        ]
-
-    result_strings.append(
-        shortcut_tip
-    )
-
-    return "\n".join(result_strings)
+    query = input_text + " in the context of cooking"
+    return f"For more details, visit: {generate_google_search_url(query)}\n{shortcut_tip}"
 
 def handle_how(context, input_text):
     tq = "How to"
@@ -282,106 +301,111 @@ def handle_how(context, input_text):
         w = input_text.split(tq, 1)[1].strip()
         return f"Here is relevant Video Link: {generate_youtube_search_url(w)}"
     elif hd in input_text:
-        current_step = context.current_recipe.steps[context.current_step - 1]
-        if current_step.methods:
-            FM = current_step.methods[0]
-            query = f"How do I {FM} for the cooking"
-            return f"{FM}: Link-- {generate_youtube_search_url(query)}"
-    else:
-        None
+        how_method = current_answers(context).how_method
+        if how_method:
+            return how_method
 
     if is_ambiguous(input_text):
+        links = current_answers(context).how
+        return f"{links}\n{how_tip}" if links else how_tip
 
-        current_step = context.current_recipe.steps[context.current_step - 1]
-        result_strings = []
-
-
-        if isinstance(current_step.methods, list):
-            for method in current_step.methods:
-                if isinstance(method, str):
-                    query = f"how do I {method} in the context of cooking"
-                    result_strings.append(
-                        f"For more details about how to '{method}', visit: {generate_youtube_search_url(query)}"
-                    )
-    else:
-
-        query = f"{input_text} in the context of cooking"
-        result_strings = [
-            f"For more details, visit: {generate_youtube_search_url(query)}"
-        ]
-
-    result_strings.append(
-        ' '.join([shortcut_tip, "or ask any other questions you have."])
-    )
-    return "\n".join(result_strings)
+    query = f"{input_text} in the context of cooking"
+    return f"For more details, visit: {generate_youtube_search_url(query)}\n{how_tip}"
 
 def handle_temperature(context):
 
-    current_step = context.current_recipe.steps[context.current_step - 1]
-
-
-    result_strings = []
-    if current_step.temps:
-
-        result_strings.append( f"Temperature : {', '.join(current_step.temps)}" )
-    else:
-
-        method = ', '.join(current_step.methods) if current_step.methods else current_step.text
-        query = f"At what temperature should I {method} when preparing {context.current_recipe.title}"
-        result_strings.append( f"No temperature specified. For more details, visit: {generate_google_search_url(query)}")
-
-    return "\n".join(result_strings)
-
-
+    return current_answers(context).temperature
 
 def handle_duration(context):
 
-
-    current_step = context.current_recipe.steps[context.current_step - 1]
-
-
-    result_strings = []
-    if current_step.times:
-
-        result_strings.append(f"Duration: {', '.join(current_step.times)}")
-    else:
-        method = ', '.join(current_step.methods) if current_step.methods else current_step.text
-        query = f"How long should I {method} when preparing {context.current_recipe.title}"
-        result_strings.append(f"No duration specified. For more details, visit: {generate_google_search_url(query)}")
-
-    return "\n".join(result_strings)
-
+    return current_answers(context).duration
 
 def handle_amount(context, prompt):
 
-    current_step = context.current_recipe.steps[context.current_step - 1]  # Convert 1-based index to 0-based
-    mentioned_ingredients = []
-
-    # Check if the prompt mentions any ingredient from the step
-    for ingredient in current_step.ingredients:
-        if ingredient.name and re.search(rf'\b{re.escape(ingredient.name)}\b', prompt, re.IGNORECASE):
-            mentioned_ingredients.append(ingredient)
-
-    result_strings = []
-
-    if mentioned_ingredients:
+    return current_answers(context).amount_for(prompt)
+
+navigation_anchors = dict([
+    ('repeat', ['repeat.v.01']),
+    ('tell', ['tell.v.02']),
+    ('travel', ['travel.v.01', 'travel.v.02']),
+])
+'''WordNet synsets whose hyponyms are each navigation action'''
+
+_please = r'(?:\s*please)?'
+navigation_keywords = re.compile(
+    rf'{_please}\s*(?:'
+    rf'(?P<repeat>repeat(?:\s+(?:that|it|this|the))?(?:\s+step)?'
+    rf'(?:\s+again)?|(?:say\s+(?:that|it)\s+)?again)'
+    rf'|(?P<travel>(?:(?:go|move|skip|jump|take\s+me)\s+)?(?:'
+    rf'(?:to\s+)?(?:the\s+)?(?:next|previous)(?:\s+(?:step|one))?'
+    rf'|(?:back|forward)(?:\s+(?:a|one|\w+)\s+steps?)?'
+    rf'|(?:back\s+)?to\s+(?:the\s+)?(?:step\s+\w+|\w+\s+step)))'
+    rf'){_please}\s*[.!?]*',
+    re.IGNORECASE)
+'''Common navigation phrasings, recognized without parsing'''
+
+@lru_cache(maxsize=None)
+def _navigation_anchor_sets() -> dict[str, frozenset]:
+    with u.wordnet_lock:
+        return {action: frozenset(wn.synset(name) for name in names)
+                for action, names in navigation_anchors.items()}
+
+@lru_cache(maxsize=1024)
+def navigation_actions(verb: str) -> frozenset[str]:
+    '''Returns the navigation actions a verb lemma is a kind of'''
+    anchor_sets = _navigation_anchor_sets()
+    hypernyms = set()
+    with u.wordnet_lock:
+        for synset in wn.synsets(verb, wn.VERB):
+            for path in synset.hypernym_paths():
+                hypernyms.update(path)
+    return frozenset(action for action, anchors
+                     in anchor_sets.items()
+                     if not hypernyms.isdisjoint(anchors))
+
+def travel(context, user_input):
+
+    # Check for "go back", "previous", or "back"
+    if any(word in user_input for word in ["back", "previous"]):
+        step_number = None
+
+        step_check_pattern = r"\bstep\b"
+        if re.search(step_check_pattern, user_input, re.IGNORECASE) is not None:
+            input_number = extract_step_number(user_input)
+            if not input_number:
+                step_number = context.current_step - 1
+            else:
+                step_number = input_number
+        else:
+            input_number = extract_step_number(user_input) or 1
+            step_number = context.current_step - input_number
+        return go_to_step(context, step_number)
 
-        for ingredient in mentioned_ingredients:
-            quantity = ingredient.quantity if ingredient.quantity else "some"
-            unit = ingredient.unit if ingredient.unit else ""
-            result_strings.append(f"Use {quantity} {unit} of {ingredient.name}.")
-    else:
+    # Check for "next step" or "forward"
+    if "next" in user_input or "forward" in user_input:
+        input_number = extract_step_number(user_input) or 1
+        step_number = context.current_step + input_number
+        return go_to_step(context, step_number)
 
-        for ingredient in current_step.ingredients:
-            quantity = ingredient.quantity if ingredient.quantity else "some"
-            unit = ingredient.unit if ingredient.unit else ""
-            result_strings.append(f"Use {quantity} {unit} of {ingredient.name}.")
+    # Check for specific step (e.g., "go to the 5th step")
+    step_number = extract_step_number(user_input)
+    if step_number:
+        if 1 <= step_number <= len(context.current_recipe.steps):
+            return go_to_step(context, step_number)
+        return "Invalid step number."
 
-    return "\n".join(result_strings)
+    return not_understood
 
 def handle_navigations(context, user_input):
 
-    doc = u.nlp(user_input.lower())
+    # Common phrasings skip the parse entirely
+    keyword = navigation_keywords.fullmatch(user_input)
+    if keyword:
+        if keyword.lastgroup == 'repeat':
+            return repeat_step(context)
+        return travel(context, user_input)
+
+    doc = u.nav_nlp(user_input.lower())
 
     # Extract the main action verb
     action = None
@@ -390,171 +414,128 @@ def handle_navigations(context, user_input):
             action = token.lemma_
             break
     if not action:
-        print("Sorry, I didn't understand that.")
-        return
+        return not_understood
 
     # Determine the intent based on the verb
-    synsets = wn.synsets(action, wn.VERB)
-    hypernyms = []
-    for synset in synsets:
-        for path in synset.hypernym_paths():
-            hypernyms.extend(path)
-
-    if wn.synset('repeat.v.01') in hypernyms or \
-        (wn.synset('tell.v.02') in hypernyms and \
-         re.findall(r'\bagain\b', user_input, re.IGNORECASE)):
-        repeat_step(context)
-        return
-
-    if wn.synset('travel.v.01') in hypernyms or \
-        wn.synset('travel.v.02') in hypernyms:
-        # Check for "go back", "previous", or "back"
-        if any(word in user_input for word in ["back", "previous"]):
-            step_number = None
-
-            step_check_pattern = pattern = r"\bstep\b"
-            if re.search(step_check_pattern, user_input, re.IGNORECASE) is not None:
-                input_number = extract_step_number(user_input)
-                if not input_number:
-                    step_number = context.current_step - 1
-                else:
-                    step_number = input_number
-            else:
-                input_number = extract_step_number(user_input) or 1
-                step_number = context.current_step - input_number
-            go_to_step(context, step_number)
-            return
+    actions = navigation_actions(action)
 
-        # Check for "next step" or "forward"
-        if "next" in user_input or "forward" in user_input:
-            input_number = extract_step_number(user_input) or 1
-            step_number = context.current_step + input_number
-            go_to_step(context, step_number)
-            return
-
-        # Check for specific step (e.g., "go to the 5th step")
-        step_number = extract_step_number(user_input)
-        if step_number:
-            if 1 <= step_number <= len(context.current_recipe.steps):
-                go_to_step(context, step_number)
-            else:
-                print("Invalid step number.")
-            return
+    if 'repeat' in actions or \
+        ('tell' in actions and \
+         re.findall(r'\bagain\b', user_input, re.IGNORECASE)):
+        return repeat_step(context)
 
+    if 'travel' in actions:
+        return travel(context, user_input)
 
-    return
+    return not_understood
 
 #################
 # INPUT HANDLER #
 #################
 
-def handle_input(context, user_input):
-
-    if contains_ingredient(user_input):
-
-        print(display_ingredients(context))
-        return
-
-    if is_temperature_related(user_input):
-
-        print(handle_temperature(context))
-        return
-    if is_amount_related(user_input):
-        print(handle_amount(context, user_input))
-        return
-    if is_duration_related(user_input):
-        print(handle_duration(context))
-        return
+def handle_input(context, user_input, intent: str | None = None):
+
+    if intent is None:
+        intent = input_router.classify(user_input)
+
+    if intent == 'ingredient':
+        return display_ingredients(context)
+    if intent == 'temperature':
+        return handle_temperature(context)
+    if intent == 'amount':
+        return handle_amount(context, user_input)
+    if intent == 'duration':
+        return handle_duration(context)
+    if intent == 'what':
+        return handle_what(context, user_input)
+    if intent == 'how':
+        return handle_how(context, user_input)
+    if intent == 'thanks':
+        return "You're welcome :)"
+
+    reply = handle_navigations(context, user_input)
+    if reply == not_understood:
+        # Small talk has no keywords, so the example-based classifier only
+        # answers messages that are neither questions nor navigation
+        small_talk, _ = default_classifier().classify(user_input)
+        if small_talk in small_talk_replies:
+            return small_talk_replies[small_talk]
+    return reply
+
+def start_recipe(context, url, recipe):
+    '''Starts a session on a fetched recipe, or asks for another URL if it
+    could not be fetched'''
+
+    context.user_prompts.append(f"Link: {url}")
+    context.current_recipe = recipe
+    context.recipe_url = normalize_url(url) if recipe else None
+    context.current_step = 0
+    if not recipe:
+        return "Invalid url, please try again. "
+
+    return "\n".join([
+        f"Got it! I'm ready to assist with the recipe for '{recipe.title}'.",
+        "Would you like to:",
+        "1. Walk through the steps",
+        "2. Get the list of ingredients",
+        "Enter 'shortcuts' to view all available keyword shortcuts, or ask "
+        "any other requests."
+    ])
+
+def respond(context, user_prompt):
+    '''Returns the reply to a prompt about the current recipe'''
+
+    context.last_active = time.time()
 
+    if user_prompt == "shortcuts":
+        context.user_prompts.append("shortcuts")
+        return display_shortcuts()
 
+    if user_prompt == "1":
+        context.user_prompts.append("1: Walk through the steps")
+        return display_step(context)
 
-    if contains_what(user_input):
-        result = handle_what(context, user_input)
-        print(result)
-        return
+    if user_prompt == "2":
+        context.user_prompts.append("2: Get the list of ingredients")
+        return display_ingredients(context)
 
-    if contains_how(user_input):
-        result = handle_how(context, user_input)
-        print(result)
-        return
-    
+    intent = session_router.classify(user_prompt)
+    if intent == 'quit':
+        context.user_prompts.append("quit")
+        context.finished = True
+        return "Thank you for using the Recipe Chatbox. Have a great day!"
 
-    if re.findall(r'\bthank(?:\b|s\b)|\bappreciate\b.*(?:you|help)',
-                  user_input, re.IGNORECASE):
-        print("You're welcome :)")
-        return
+    if intent == 'new':
+        context.current_recipe = None
+        context.recipe_url = None
+        return url_request
 
-    handle_navigations(context, user_input)
+    return handle_input(context, user_prompt, intent)
 
 #############
 # INTERFACE #
 #############
 
-def CI(new_session: bool = True):
+def CI():
 
   context = Context()
-  if new_session:
-    print("Welcome to Recipe Chatbox! ", end='')
-  print("Please enter the URL of the recipe you need assistance with.")
-  recipe = None
+  print("Welcome to Recipe Chatbox! ", end='')
+  print(url_request)
 
-  while (not recipe ):
+  while not context.finished:
 
+    if context.current_recipe is None:
         user_L = input("Input the Link here: ") #user input here for link
         print(user_L)
 
-
-        context.user_prompts.append(f"Link: {user_L}") # store user input link
-        recipe = get_recipe_from_url(user_L)#parser to get the link content
-        context.current_recipe = recipe
-
-        if recipe:
-          continue
-        else:
-          print("Invalid url, please try again. ")
-
-
-  print(f"Got it! I'm ready to assist with the recipe for '{recipe.title}'.")
-  print("Would you like to:")
-  print("1. Walk through the steps")
-  print("2. Get the list of ingredients")
-  print("Enter 'shortcuts' to view all available keyword shortcuts, or ask "
-        "any other requests.")
-
-  while True:
+        recipe = get_recipe_from_url(user_L, cache=default_cache())#parser to get the link content
+        print(start_recipe(context, user_L, recipe))
+        continue
 
     user_prompt = input("You: ").strip().lower()
-
-    if user_prompt == "shortcuts":
-        context.user_prompts.append("shortcuts")
-        display_shortcuts()
-
-    elif user_prompt == "1":
-      context.user_prompts.append("1: Walk through the steps")
-      display_step( context)
-
-    elif user_prompt == "2":
-      context.user_prompts.append("2: Get the list of ingredients")
-      display_ingredients(context)
-
-    elif user_prompt == "quit" or \
-        re.findall(r'\b(?:end|stop|leave)\b.*\b(?:session|program|script)\b'
-                   r'|\bquit\b|\bexit\b',
-                   user_prompt, re.IGNORECASE):
-      context.user_prompts.append("quit")
-      print("Thank you for using the Recipe Chatbox. Have a great day!")
-      break
-
-    elif user_prompt == "new" or \
-        re.findall(r'\b(?:new|another|different) recipe\b',
-                   user_prompt, re.IGNORECASE):
-        CI(False)
-        return
-
-
-    else:
-      handle_input(context,user_prompt)
+    print(respond(context, user_prompt))
 
 
 if __name__ == "__main__":
+    u.ensure_nltk_data()
     CI()
@@ -0,0 +1,186 @@
+'''Bounded store of chat sessions that snapshots them to disk.
+
+Active sessions are kept in memory, least recently used first. Sessions
+that sit idle, or that no longer fit, are written to disk and dropped, and
+are read back on their next use. Snapshots refer to the recipe by its URL,
+the key of the recipe cache, so restoring a session is cheap.
+'''
+
+import os
+import re
+import secrets
+import srsly
+import threading
+import time
+
+from collections import OrderedDict
+from recipe_chatbox import Context
+
+#############
+# VARIABLES #
+#############
+
+SESSION_PATH = os.environ.get(
+    'RECIPE_SESSION_PATH',
+    os.path.join(os.path.expanduser('~'), '.cache', 'recipe_chatbox',
+                 'sessions'))
+'''Directory holding session snapshots'''
+
+MAX_SESSIONS = 1024
+'''Number of sessions kept in memory'''
+
+SESSION_IDLE_TIMEOUT = 30 * 60
+'''Seconds a session stays in memory without a prompt'''
+
+SESSION_TTL = 7 * 24 * 60 * 60
+'''Seconds a snapshot stays valid after its last prompt'''
+
+SNAPSHOT_VERSION = 1
+'''Version of the snapshot format'''
+
+_session_id_re = re.compile(r'[\w-]{1,64}')
+
+###############
+# STORE CLASS #
+###############
+
+class SessionStore:
+    '''LRU of active sessions by ID, backed by snapshots on disk'''
+
+    def __init__(self, path: str | None = SESSION_PATH,
+                 max_sessions: int = MAX_SESSIONS,
+                 idle_timeout: float = SESSION_IDLE_TIMEOUT,
+                 ttl: float = SESSION_TTL) -> None:
+        self.path = path
+        '''Directory of snapshots, or None to keep sessions only in memory'''
+        self.max_sessions = max_sessions
+        '''Number of sessions kept in memory'''
+        self.idle_timeout = idle_timeout
+        '''Seconds a session stays in memory without a prompt'''
+        self.ttl = ttl
+        '''Seconds a snapshot stays valid after its last prompt'''
+        self.sessions: OrderedDict[str, Context] = OrderedDict()
+        '''Sessions in memory, least recently used first'''
+        self.lock = threading.RLock()
+
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self.sessions
+
+    def __file(self, session_id: str) -> str:
+        return os.path.join(self.path, f'{session_id}.msgpack')
+
+    def create(self) -> tuple[str, Context]:
+        '''Starts a new session, returning its ID and context'''
+        session_id = secrets.token_urlsafe(9)
+        context = Context()
+        self.put(session_id, context)
+        return session_id, context
+
+    def put(self, session_id: str, context: Context) -> None:
+        '''Adds or refreshes a session, evicting the least recently used
+        ones if the store is full'''
+        with self.lock:
+            self.sessions[session_id] = context
+            self.sessions.move_to_end(session_id)
+            while len(self.sessions) > self.max_sessions:
+                self.__evict(next(iter(self.sessions)))
+
+    def get(self, session_id: str) -> Context | None:
+        '''Returns a session, restoring it from its snapshot if it is not in
+        memory. A restored session has its recipe_url but no recipe yet.'''
+        with self.lock:
+            context = self.sessions.get(session_id)
+            if context is not None:
+                self.sessions.move_to_end(session_id)
+                return context
+            context = self.load(session_id)
+            if context is not None:
+                self.put(session_id, context)
+            return context
+
+    def save(self, session_id: str, context: Context | None = None) -> None:
+        '''Writes the snapshot of a session, by default the one in memory'''
+        with self.lock:
+            context = context or self.sessions.get(session_id)
+            if context is None or self.path is None:
+                return
+            if context.finished or context.recipe_url is None:
+                # Nothing worth resuming
+                self.__remove_file(session_id)
+                return
+            data = srsly.msgpack_dumps({'version': SNAPSHOT_VERSION,
+                                        **context.to_dict()})
+        file = self.__file(session_id)
+        tmp = f'{file}.{threading.get_ident()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, file)
+
+    def load(self, session_id: str) -> Context | None:
+        '''Reads the snapshot of a session, if it has a valid one'''
+        if self.path is None or not _session_id_re.fullmatch(session_id):
+            return None
+        try:
+            with open(self.__file(session_id), 'rb') as f:
+                data = srsly.msgpack_loads(f.read())
+        except (OSError, ValueError):
+            return None
+        if data.get('version') != SNAPSHOT_VERSION or \
+                data['last_active'] < time.time() - self.ttl:
+            return None
+        return Context.from_dict(data)
+
+    def discard(self, session_id: str) -> None:
+        '''Removes a session from memory and disk'''
+        with self.lock:
+            self.sessions.pop(session_id, None)
+        self.__remove_file(session_id)
+
+    def __remove_file(self, session_id: str) -> None:
+        if self.path is None:
+            return
+        try:
+            os.remove(self.__file(session_id))
+        except FileNotFoundError:
+            pass
+
+    def __evict(self, session_id: str) -> None:
+        self.save(session_id)
+        del self.sessions[session_id]
+
+    def evict_idle(self, now: float | None = None) -> int:
+        '''Snapshots and drops the sessions idle for longer than the
+        timeout, returning how many were evicted'''
+        cutoff = (now or time.time()) - self.idle_timeout
+        with self.lock:
+            idle = [session_id for session_id, context
+                    in self.sessions.items()
+                    if context.last_active < cutoff]
+            for session_id in idle:
+                self.__evict(session_id)
+        return len(idle)
+
+    def prune(self) -> int:
+        '''Deletes expired snapshots, returning how many were deleted'''
+        if self.path is None:
+            return 0
+        cutoff = time.time() - self.ttl
+        pruned = 0
+        for entry in os.scandir(self.path):
+            if entry.name.endswith('.msgpack') and \
+                    entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                pruned += 1
+        return pruned
+
+    def close(self) -> None:
+        '''Snapshots every session in memory'''
+        with self.lock:
+            for session_id in list(self.sessions):
+                self.__evict(session_id)
@@ -0,0 +1,100 @@
+'''Tests that the ingredient index finds what a linear search would'''
+
+import random
+import recipe as r
+
+from fractions import Fraction
+
+words = ['salt', 'black', 'pepper', 'olive', 'oil', 'butter', 'unsalted',
+         'garlic', 'clove', 'cloves', 'onion', 'red', 'flour', 'sugar',
+         'brown', 'egg', 'eggs', 'large', 'chicken', 'thighs', 'stock', 'a']
+'''Words ingredient names and references are made of, overlapping often'''
+
+def linear_find(name: str, ingredients: list[r.Ingredient]) -> list[int]:
+    '''The search the index replaced, scanning every ingredient in order'''
+    ingr_inds = []
+    components = name.split()
+
+    # Remove any determiners
+    if components and components[0] in ['the', 'a', 'an']:
+        del components[0]
+        name = ' '.join(components)
+
+    # If name is empty, return
+    if not name:
+        return ingr_inds
+
+    # Initialize confidence to 1/2 of number of words
+    max_confidence = len(components) / 2
+
+    for i in range(len(ingredients)):
+        if name == ingredients[i].name:
+            # Return if an exact match
+            return [i]
+        elif name in ingredients[i].name:
+            # If a substring, add to list and limit search to other substrs
+            ingr_inds.append(i)
+            max_confidence = len(components) + 1
+        elif max_confidence <= len(components):
+            # Check how many words match and add to list if == current max or
+            # reset list to just it
+            confidence = 0
+            for wd in components:
+                if wd in ingredients[i].name:
+                    confidence += 1
+            if confidence > max_confidence:
+                ingr_inds = [i]
+            elif confidence == max_confidence:
+                ingr_inds.append(i)
+
+    return ingr_inds
+
+def random_name(rng: random.Random) -> str:
+    return ' '.join(rng.choice(words) for _ in range(rng.randint(1, 3)))
+
+def random_reference(rng: random.Random,
+                     ingredients: list[r.Ingredient]) -> str:
+    if rng.random() < 0.3:
+        # Part or all of an actual name, maybe with a determiner
+        name = rng.choice(ingredients).name.split()
+        start = rng.randrange(len(name))
+        name = name[start:rng.randint(start + 1, len(name))]
+        return ' '.join((['the'] if rng.random() < 0.3 else []) + name)
+    if rng.random() < 0.2:
+        # Part of a word
+        word = rng.choice(words)
+        return word[:rng.randint(1, len(word))]
+    return random_name(rng)
+
+def test_index_matches_linear_search():
+    rng = random.Random(337)
+    for _ in range(500):
+        ingredients = [r.Ingredient(random_name(rng))
+                       for _ in range(rng.randint(1, 12))]
+        index = r.IngredientIndex(ingredients)
+        remaining = list(range(len(ingredients)))
+        for _ in range(20):
+            if len(remaining) > 1 and rng.random() < 0.2:
+                ind = remaining.pop(rng.randrange(len(remaining)))
+                index.discard(ind)
+            name = random_reference(rng, ingredients)
+            expected = [remaining[i] for i in linear_find(
+                name, [ingredients[i] for i in remaining])]
+            assert index.find(name) == expected, (name, ingredients)
+
+def test_ledger_releases_and_rebuilds_index():
+    ingredients = [r.Ingredient('olive oil', Fraction(2), 'tablespoon'),
+                   r.Ingredient('garlic cloves', Fraction(3)),
+                   r.Ingredient('oil', Fraction(1), 'cup')]
+    ledger = r.IngredientLedger(ingredients)
+    ledger.add_step()
+    assert ledger.find('oil') == [2]
+    ledger.consume(2, Fraction(1))
+    assert ledger.find('oil') == [0]
+    ledger.release_index()
+    assert ledger.index is None
+
+    # Steps parsed later see only what is left
+    ledger.add_step()
+    assert ledger.find('oil') == [0]
+    assert ledger.find('garlic') == [1]
@@ -0,0 +1,78 @@
+'''Tests that streamed pages parse the same as whole pages'''
+
+import os
+import parser as p
+import pytest
+import util as u
+
+FIXTURES_PATH = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'benchmarks', 'fixtures', 'synthetic_html')
+
+CHUNK_SIZES = (1, 40, 97, 100, 120, 130, 150, 1024, p.STREAM_CHUNK_SIZE)
+
+footer_page = '''<html><body>
+<h1 data-testid="ContentHeaderHed">Toast</h1>
+<div data-testid="InstructionsWrapper">
+<p>Toast the bread until golden.</p>
+<p>Butter it while still warm.</p>
+<p>Serve right away.</p>
+</div>
+<div class="footer">
+<p>Sign up for our newsletter to get recipes every week.</p>
+<p>Copyright 2024. All rights reserved.</p>
+</div>
+</body></html>'''
+'''Page with paragraphs after its steps, which any <p> would count as'''
+
+trailing_jsonld_page = footer_page.replace('</body>', '''
+<script type="application/ld+json">
+{"@context": "https://schema.org", "@type": "Recipe", "name": "Toast",
+ "recipeIngredient": ["2 slices bread", "1 tablespoon butter"],
+ "recipeInstructions": [{"@type": "HowToStep", "text": "Toast the bread."}]}
+</script>
+</body>''')
+'''Page whose structured data comes after its steps'''
+
+def fixture_pages() -> list[tuple[u.RecipeSource, str]]:
+    pages = []
+    for source_dir in sorted(os.listdir(FIXTURES_PATH)):
+        path = os.path.join(FIXTURES_PATH, source_dir)
+        for name in sorted(os.listdir(path)):
+            with open(os.path.join(path, name), encoding='utf-8') as f:
+                pages.append((u.RecipeSource[source_dir.upper()], f.read()))
+    return pages
+
+def scraped(html: str, source: u.RecipeSource,
+            chunk_size: int | None = None) -> tuple:
+    '''Feeds a page, whole or in chunks, and returns what was scraped from
+    it before any NLP'''
+    parser = p.RecipeHTMLParser(source)
+    if chunk_size is None:
+        parser.feed(html)
+    else:
+        parser.feed_stream(html[i:i + chunk_size]
+                           for i in range(0, len(html), chunk_size))
+    return (parser.recipe.title, parser.recipe.other, parser.instructions,
+            [(name, ingredient.quantity, ingredient.unit)
+             for (ingredient, name) in parser.ingredient_names],
+            parser.structured is not None)
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+def test_steps_end_with_steps_section(chunk_size):
+    whole = scraped(footer_page, u.RecipeSource.EPICURIOUS)
+    assert [step.strip() for step in whole[2]] == [
+        'Toast the bread until golden.', 'Butter it while still warm.',
+        'Serve right away.']
+    assert scraped(footer_page, u.RecipeSource.EPICURIOUS,
+                   chunk_size) == whole
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+def test_jsonld_after_steps_is_read(chunk_size):
+    assert scraped(trailing_jsonld_page, u.RecipeSource.EPICURIOUS,
+                   chunk_size)[-1]
+    assert p.jsonld.find_recipe_data(trailing_jsonld_page) is not None
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+def test_fixtures_stream_like_whole_pages(chunk_size):
+    for (source, html) in fixture_pages():
+        assert scraped(html, source, chunk_size) == scraped(html, source)
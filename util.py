@@ -1,20 +1,39 @@
 '''Utility enums and functions for recipe parsing and display.'''
 
+import nltk
+import os
 import re
-import spacy
-import unicodedata
+import sys
+import threading
 
 from enum import Enum, auto
 from fractions import Fraction
+from functools import lru_cache
 from nltk.corpus import wordnet as wn
+from quantity import is_quantity, parse_quantity
 
 #############
 # VARIABLES #
 #############
 
-nlp = spacy.load("en_core_web_md")
+NLP_MODEL = "en_core_web_md"
+'''Name of the SpaCy model to load'''
+
+nlp_profiles = dict([
+    ("navigation", ["tok2vec", "tagger", "attribute_ruler", "lemmatizer"]),
+    ("steps", ["tok2vec", "tagger", "parser", "attribute_ruler", "lemmatizer",
+               "ner"])
+])
+'''SpaCy components needed by each kind of caller'''
+
+nltk_resources = [
+    ("tokenizers/punkt_tab", "punkt_tab"),
+    ("corpora/wordnet", "wordnet")
+]
+'''NLTK data needed for parsing, as (resource path, package name) pairs'''
 
 unit_dict = dict([
+    ("fluid ounce", r'\bfl\.?\s?oz(?:\.|\b)'),
     ("ounce", r'\boz(?:\.|\b)'),
     ("pound", r'\blb(?:\.|s\b|\b)'),
     ("grams", r'\bg(?:\.|\b)'),
@@ -23,8 +42,77 @@ unit_dict = dict([
     ("tablespoon", r'\btbsp(?:\.|s\b|\b)'),
     ("gallon", r'\bgal(?:\.|s\b|\b)'),
     ("milliliters", r'\bml(?:\.|\b)'),
-    ("liter", r'\bl(?:\.|\b)')
+    ("liter", r'\bl(?:\.|\b)'),
+    ("centiliter", r'\bcl(?:\.|\b)'),
+    ("deciliter", r'\bdl(?:\.|\b)'),
+    ("milligram", r'\bmg(?:\.|s\b|\b)'),
+    ("pint", r'\bpts?(?:\.|\b)'),
+    ("quart", r'\bqts?(?:\.|\b)')
 ])
+'''Abbreviation pattern of each cooking unit. Patterns must not contain
+capturing groups, and a pattern listed earlier wins where two match at the
+same place (e.g. fl oz before oz).'''
+
+##################
+# LANGUAGE MODEL #
+##################
+
+_nlp_lock = threading.Lock()
+_nlp_model = None
+_nlp_components: frozenset[str] = frozenset()
+
+def _load_nlp_model(components: frozenset[str]):
+    '''Loads the SpaCy model with at least the given components, reusing the
+    loaded model if it already has them'''
+    global _nlp_model, _nlp_components
+    with _nlp_lock:
+        if _nlp_model is None or not components <= _nlp_components:
+            import spacy
+            components = components | _nlp_components
+            known = set().union(*nlp_profiles.values(), ["senter"])
+            _nlp_model = spacy.load(NLP_MODEL,
+                                    exclude=sorted(known - components))
+            _nlp_components = components
+        return _nlp_model
+
+class LazyNLP:
+    '''SpaCy pipeline that is loaded on first use, running only the
+    components of a given profile'''
+
+    def __init__(self, profile: str):
+        self.profile = profile
+        '''Name of the profile in nlp_profiles'''
+        self.components = frozenset(nlp_profiles[profile])
+        '''Components run by this pipeline'''
+
+    @property
+    def model(self):
+        '''The underlying SpaCy Language object'''
+        return _load_nlp_model(self.components)
+
+    def __disabled(self, model) -> list[str]:
+        return [name for name in model.pipe_names
+                if name not in self.components]
+
+    def __call__(self, text: str):
+        model = self.model
+        return model(text, disable=self.__disabled(model))
+
+    def pipe(self, texts, **kwargs):
+        model = self.model
+        return model.pipe(texts, disable=self.__disabled(model), **kwargs)
+
+    def __getattr__(self, name: str):
+        # Everything else (make_doc, tokenizer, vocab, ...) is the model's
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.model, name)
+
+nlp = LazyNLP("steps")
+'''Full pipeline, used to parse recipe steps'''
+
+nav_nlp = LazyNLP("navigation")
+'''Tagger-only pipeline, used to interpret navigation requests'''
 
 #########
 # ENUMS #
@@ -64,135 +152,24 @@ class HTMLTag(Enum):
     STEPS_LIST = auto()
     STEP = auto()
 
-    @classmethod
-    def __from_allrecipes_tag(cls, tag: str,
-                              attrs: list[tuple[str, str | None]]):
-        if tag == 'h1':
-            if attrs == [('class', 'article-heading text-headline-400')]:
-                return HTMLTag.TITLE
-        elif tag == 'div':
-            if attrs == [('class', 'mm-recipes-details__label')]:
-                return HTMLTag.OVERVIEW_LABEL
-            elif attrs == [('class', 'mm-recipes-details__value')]:
-                return HTMLTag.OVERVIEW_TEXT
-            elif ('class', 'comp mm-recipes-steps mntl-block') \
-                    in attrs:
-                return HTMLTag.STEPS_LIST
-        elif tag == 'ul':
-            if ('class', 'mm-recipes-structured-ingredients__list') in attrs:
-                return HTMLTag.INGREDIENTS_LIST
-        elif tag == 'li':
-            if ('class', 'mm-recipes-structured-ingredients__list-item ') in attrs:
-                return HTMLTag.INGREDIENT
-        elif tag == 'span':
-            if attrs == [('data-ingredient-quantity', 'true')]:
-                return HTMLTag.INGREDIENT_QUANTITY
-            elif attrs == [('data-ingredient-unit', 'true')]:
-                return HTMLTag.INGREDIENT_UNIT
-            elif attrs == [('data-ingredient-name', 'true')]:
-                return HTMLTag.INGREDIENT_NAME
-        elif tag == 'p':
-            if ('class', 'comp mntl-sc-block mntl-sc-block-html') in attrs:
-                return HTMLTag.STEP
-        return HTMLTag.UNKNOWN
-    
-    @classmethod
-    def __from_seriouseats_tag(cls, tag: str,
-                               attrs: list[tuple[str, str | None]]):
-        if tag == 'h1':
-            if attrs == [('class', 'heading__title')]:
-                return HTMLTag.TITLE
-        elif tag == 'span':
-            if attrs == [('class', 'meta-text__label')]:
-                return HTMLTag.OVERVIEW_LABEL
-            elif attrs == [('class', 'meta-text__data')]:
-                return HTMLTag.OVERVIEW_TEXT
-            elif attrs == [('data-ingredient-quantity', 'true')]:
-                return HTMLTag.INGREDIENT_QUANTITY
-            elif attrs == [('data-ingredient-unit', 'true')]:
-                return HTMLTag.INGREDIENT_UNIT
-            elif attrs == [('data-ingredient-name', 'true')]:
-                return HTMLTag.INGREDIENT_NAME
-        elif tag == 'section':
-            if ('class', 'comp section--ingredients section') in attrs:
-                return HTMLTag.INGREDIENTS_LIST
-            elif ('class', 'comp section--instructions section') \
-                    in attrs:
-                return HTMLTag.STEPS_LIST
-        elif tag == 'li':
-            if ('class', 'structured-ingredients__list-item') in attrs:
-                return HTMLTag.INGREDIENT
-        elif tag == 'p':
-            if ('class', 'comp mntl-sc-block mntl-sc-block-html') in attrs:
-                return HTMLTag.STEP
-        return HTMLTag.UNKNOWN
-    
-    @classmethod
-    def __from_epicurious_tag(cls, tag: str,
-                              attrs: list[tuple[str, str | None]]):
-        if tag == 'h1':
-            if ('data-testid', 'ContentHeaderHed') in attrs:
-                return HTMLTag.TITLE
-        elif tag == 'p':
-            if attrs == [('class', 'BaseWrap-sc-gjQpdd BaseText-ewhhUZ'
-                          ' InfoSliceKey-gHIvng iUEiRd dWUQxN hykkRA')]:
-                return HTMLTag.OVERVIEW_LABEL
-            elif attrs == [('class', 'BaseWrap-sc-gjQpdd BaseText-ewhhUZ'
-                            ' InfoSliceValue-tfmqg iUEiRd bbekcU fkSlPp')]:
-                return HTMLTag.OVERVIEW_TEXT
-            else:
-                return HTMLTag.STEP
-        elif tag == 'div':
-            if ('data-testid', 'IngredientList') in attrs:
-                return HTMLTag.INGREDIENTS_LIST
-            elif attrs == [('class', 'BaseWrap-sc-gjQpdd BaseText-ewhhUZ'
-                            ' Description-cSrMCf iUEiRd bGCtOd fsKnGI')]:
-                return HTMLTag.INGREDIENT_NAME
-            elif ('data-testid', 'InstructionsWrapper') in attrs:
-                return HTMLTag.STEPS_LIST
-        return HTMLTag.UNKNOWN
-    
-    @classmethod
-    def __from_bonappetit_tag(cls, tag: str,
-                              attrs: list[tuple[str, str | None]]):
-        if tag == 'h1':
-            if ('data-testid', 'ContentHeaderHed') in attrs:
-                return HTMLTag.TITLE
-        elif tag == 'p':
-            if attrs == [('class', 'BaseWrap-sc-gjQpdd BaseText-ewhhUZ'
-                          ' InfoSliceKey-gHIvng iUEiRd gmMvZM hykkRA')]:
-                return HTMLTag.OVERVIEW_LABEL
-            elif attrs == [('class', 'BaseWrap-sc-gjQpdd BaseText-ewhhUZ'
-                            ' InfoSliceValue-tfmqg iUEiRd hjxWdt fkSlPp')]:
-                return HTMLTag.OVERVIEW_TEXT
-            elif attrs == [('class', 'BaseWrap-sc-gjQpdd BaseText-ewhhUZ'
-                            ' Amount-hYcAMN iUEiRd gMBhLy hoAJEl')]:
-                return HTMLTag.INGREDIENT_QUANTITY
-            else:
-                return HTMLTag.STEP
-        elif tag == 'div':
-            if ('data-testid', 'IngredientList') in attrs:
-                return HTMLTag.INGREDIENTS_LIST
-            elif attrs == [('class', 'BaseWrap-sc-gjQpdd BaseText-ewhhUZ'
-                            ' Description-cSrMCf iUEiRd gMBhLy fsKnGI')]:
-                return HTMLTag.INGREDIENT_NAME
-            elif ('data-testid', 'InstructionsWrapper') in attrs:
-                return HTMLTag.STEPS_LIST
-        return HTMLTag.UNKNOWN
-
     @classmethod
     def from_tag(cls, source: RecipeSource, tag: str,
                  attrs: list[tuple[str, str | None]]):
-        match source:
-            case RecipeSource.ALLRECIPES:
-                return HTMLTag.__from_allrecipes_tag(tag, attrs)
-            case RecipeSource.SERIOUSEATS:
-                return HTMLTag.__from_seriouseats_tag(tag, attrs)
-            case RecipeSource.EPICURIOUS:
-                return HTMLTag.__from_epicurious_tag(tag, attrs)
-            case RecipeSource.BONAPPETIT:
-                return HTMLTag.__from_bonappetit_tag(tag, attrs)
-        return HTMLTag.UNKNOWN
+        table = _tag_tables.get(source)
+        if table is None or tag not in table.tags:
+            return HTMLTag.UNKNOWN
+
+        # Find the highest-priority rule matching the tag and its attributes
+        best = None
+        if len(attrs) == 1:
+            best = table.only.get((tag, *attrs[0]))
+        for (name, value) in attrs:
+            match = table.has.get((tag, name, value))
+            if match and (best is None or match[0] < best[0]):
+                best = match
+        if best:
+            return best[1]
+        return table.default.get(tag, HTMLTag.UNKNOWN)
 
 class NounType(Enum):
     '''Enum of relevant noun types'''
@@ -204,54 +181,266 @@ class NounType(Enum):
 
     @classmethod
     def from_str(cls, noun: str):
-        ntypes = []
-        sets = wn.synsets(noun, wn.NOUN)
-        for s in sets:
-            for ss in s.hypernym_paths():
-                if (wn.synset('kitchen_utensil.n.01') in ss or \
-                    wn.synset('kitchen_appliance.n.01') in ss or \
-                    wn.synset('container.n.01') in ss) and \
-                        NounType.TOOL not in ntypes:
-                    ntypes.append(NounType.TOOL)
-                elif wn.synset('measure.n.02') in ss and \
-                NounType.MEASURE not in ntypes:
-                    ntypes.append(NounType.MEASURE)
-                elif (wn.synset('food.n.01') in ss or \
-                      wn.synset('food.n.02') in ss or \
-                      wn.synset('leaven.n.01') in ss) and \
-                        NounType.FOOD not in ntypes:
-                    ntypes.append(NounType.FOOD)
-                elif (wn.synset('temperature.n.01') in ss or \
-                      wn.synset('fire.n.03') in ss or \
-                      wn.synset('temperature_unit.n.01') in ss) and \
-                      NounType.TEMPERATURE not in ntypes:
-                    ntypes.append(NounType.TEMPERATURE)
-        return ntypes
+        return list(_classify_noun(noun.lower()))
+
+#############
+# SELECTORS #
+#############
+
+tag_selectors = dict([
+    (RecipeSource.ALLRECIPES, [
+        ('h1', 'only', ('class', 'article-heading text-headline-400'),
+         HTMLTag.TITLE),
+        ('div', 'only', ('class', 'mm-recipes-details__label'),
+         HTMLTag.OVERVIEW_LABEL),
+        ('div', 'only', ('class', 'mm-recipes-details__value'),
+         HTMLTag.OVERVIEW_TEXT),
+        ('div', 'has', ('class', 'comp mm-recipes-steps mntl-block'),
+         HTMLTag.STEPS_LIST),
+        ('ul', 'has', ('class', 'mm-recipes-structured-ingredients__list'),
+         HTMLTag.INGREDIENTS_LIST),
+        ('li', 'has', ('class', 'mm-recipes-structured-ingredients__list-item '),
+         HTMLTag.INGREDIENT),
+        ('span', 'only', ('data-ingredient-quantity', 'true'),
+         HTMLTag.INGREDIENT_QUANTITY),
+        ('span', 'only', ('data-ingredient-unit', 'true'),
+         HTMLTag.INGREDIENT_UNIT),
+        ('span', 'only', ('data-ingredient-name', 'true'),
+         HTMLTag.INGREDIENT_NAME),
+        ('p', 'has', ('class', 'comp mntl-sc-block mntl-sc-block-html'),
+         HTMLTag.STEP)
+    ]),
+    (RecipeSource.SERIOUSEATS, [
+        ('h1', 'only', ('class', 'heading__title'), HTMLTag.TITLE),
+        ('span', 'only', ('class', 'meta-text__label'),
+         HTMLTag.OVERVIEW_LABEL),
+        ('span', 'only', ('class', 'meta-text__data'), HTMLTag.OVERVIEW_TEXT),
+        ('span', 'only', ('data-ingredient-quantity', 'true'),
+         HTMLTag.INGREDIENT_QUANTITY),
+        ('span', 'only', ('data-ingredient-unit', 'true'),
+         HTMLTag.INGREDIENT_UNIT),
+        ('span', 'only', ('data-ingredient-name', 'true'),
+         HTMLTag.INGREDIENT_NAME),
+        ('section', 'has', ('class', 'comp section--ingredients section'),
+         HTMLTag.INGREDIENTS_LIST),
+        ('section', 'has', ('class', 'comp section--instructions section'),
+         HTMLTag.STEPS_LIST),
+        ('li', 'has', ('class', 'structured-ingredients__list-item'),
+         HTMLTag.INGREDIENT),
+        ('p', 'has', ('class', 'comp mntl-sc-block mntl-sc-block-html'),
+         HTMLTag.STEP)
+    ]),
+    (RecipeSource.EPICURIOUS, [
+        ('h1', 'has', ('data-testid', 'ContentHeaderHed'), HTMLTag.TITLE),
+        ('p', 'only', ('class', 'BaseWrap-sc-gjQpdd BaseText-ewhhUZ'
+                       ' InfoSliceKey-gHIvng iUEiRd dWUQxN hykkRA'),
+         HTMLTag.OVERVIEW_LABEL),
+        ('p', 'only', ('class', 'BaseWrap-sc-gjQpdd BaseText-ewhhUZ'
+                       ' InfoSliceValue-tfmqg iUEiRd bbekcU fkSlPp'),
+         HTMLTag.OVERVIEW_TEXT),
+        ('p', 'default', None, HTMLTag.STEP),
+        ('div', 'has', ('data-testid', 'IngredientList'),
+         HTMLTag.INGREDIENTS_LIST),
+        ('div', 'only', ('class', 'BaseWrap-sc-gjQpdd BaseText-ewhhUZ'
+                         ' Description-cSrMCf iUEiRd bGCtOd fsKnGI'),
+         HTMLTag.INGREDIENT_NAME),
+        ('div', 'has', ('data-testid', 'InstructionsWrapper'),
+         HTMLTag.STEPS_LIST)
+    ]),
+    (RecipeSource.BONAPPETIT, [
+        ('h1', 'has', ('data-testid', 'ContentHeaderHed'), HTMLTag.TITLE),
+        ('p', 'only', ('class', 'BaseWrap-sc-gjQpdd BaseText-ewhhUZ'
+                       ' InfoSliceKey-gHIvng iUEiRd gmMvZM hykkRA'),
+         HTMLTag.OVERVIEW_LABEL),
+        ('p', 'only', ('class', 'BaseWrap-sc-gjQpdd BaseText-ewhhUZ'
+                       ' InfoSliceValue-tfmqg iUEiRd hjxWdt fkSlPp'),
+         HTMLTag.OVERVIEW_TEXT),
+        ('p', 'only', ('class', 'BaseWrap-sc-gjQpdd BaseText-ewhhUZ'
+                       ' Amount-hYcAMN iUEiRd gMBhLy hoAJEl'),
+         HTMLTag.INGREDIENT_QUANTITY),
+        ('p', 'default', None, HTMLTag.STEP),
+        ('div', 'has', ('data-testid', 'IngredientList'),
+         HTMLTag.INGREDIENTS_LIST),
+        ('div', 'only', ('class', 'BaseWrap-sc-gjQpdd BaseText-ewhhUZ'
+                         ' Description-cSrMCf iUEiRd gMBhLy fsKnGI'),
+         HTMLTag.INGREDIENT_NAME),
+        ('div', 'has', ('data-testid', 'InstructionsWrapper'),
+         HTMLTag.STEPS_LIST)
+    ])
+])
+'''Rules classifying each source's HTML tags, in priority order, as
+(tag, kind, attribute, result). A rule of kind 'only' matches a tag whose
+only attribute is the given one, 'has' matches a tag with the attribute
+among others, and 'default' matches any other tag of that name.'''
+
+class _TagTable:
+    '''Selector rules of one source, compiled into lookup tables'''
+
+    def __init__(self, rules: list[tuple[str, str, tuple[str, str] | None,
+                                         HTMLTag]]):
+        self.tags: set[str] = set()
+        '''Names of tags with any rule'''
+        self.only: dict[tuple[str, str, str], tuple[int, HTMLTag]] = {}
+        '''(priority, result) of 'only' rules by (tag, attribute)'''
+        self.has: dict[tuple[str, str, str], tuple[int, HTMLTag]] = {}
+        '''(priority, result) of 'has' rules by (tag, attribute)'''
+        self.default: dict[str, HTMLTag] = {}
+        '''Result of 'default' rules by tag'''
+        for (priority, (tag, kind, attr, result)) in enumerate(rules):
+            self.tags.add(tag)
+            if kind == 'default':
+                self.default.setdefault(tag, result)
+            else:
+                getattr(self, kind).setdefault((tag, *attr),
+                                               (priority, result))
+
+_tag_tables = {source: _TagTable(rules)
+               for (source, rules) in tag_selectors.items()}
+
+##############
+# CLASSIFIER #
+##############
+
+NOUN_TYPE_CACHE_SIZE = 8192
+'''Maximum number of lemmas memoized by the noun type classifier'''
+
+noun_type_anchors = [
+    (NounType.TOOL, ['kitchen_utensil.n.01', 'kitchen_appliance.n.01',
+                     'container.n.01']),
+    (NounType.MEASURE, ['measure.n.02']),
+    (NounType.FOOD, ['food.n.01', 'food.n.02', 'leaven.n.01']),
+    (NounType.TEMPERATURE, ['temperature.n.01', 'fire.n.03',
+                            'temperature_unit.n.01'])
+]
+'''WordNet synsets whose hyponyms belong to each noun type, in priority
+order'''
+
+wordnet_lock = threading.Lock()
+'''Held around every WordNet lookup, since NLTK's corpus reader loads
+synsets lazily and is not thread-safe'''
+
+@lru_cache(maxsize=1)
+def _noun_type_anchor_sets():
+    '''Resolves the anchor synsets once, as sets for membership checks'''
+    with wordnet_lock:
+        return tuple((ntype, frozenset(wn.synset(name) for name in names))
+                     for (ntype, names) in noun_type_anchors)
+
+NOUN_LEXICON_PATH = os.environ.get(
+    'NOUN_LEXICON_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data',
+                 'noun_types.marisa'))
+'''Location of the prebuilt noun type lexicon (see build_lexicon.py)'''
+
+NOUN_LEXICON_EXACT = 0x80
+'''Lexicon flag marking irregular forms whose types need no suffix rules'''
+
+noun_suffix_rules = [
+    ("s", ""), ("ses", "s"), ("ves", "f"), ("xes", "x"), ("zes", "z"),
+    ("ches", "ch"), ("shes", "sh"), ("men", "man"), ("ies", "y")
+]
+'''WordNet's noun detachment rules, used to find base forms in the lexicon'''
+
+@lru_cache(maxsize=1)
+def _noun_lexicon():
+    '''Loads the prebuilt noun type lexicon, or None if it was not built'''
+    if not os.path.exists(NOUN_LEXICON_PATH):
+        return None
+    import marisa_trie
+    return marisa_trie.RecordTrie('<B').mmap(NOUN_LEXICON_PATH)
+
+def _lexicon_noun_types(lexicon, noun: str) -> tuple[NounType, ...]:
+    '''Classifies a (lowercase) noun with lexicon lookups only'''
+    noun = noun.replace(' ', '_')
+    mask = 0
+    if noun in lexicon:
+        mask = lexicon[noun][0][0]
+    if not mask & NOUN_LEXICON_EXACT:
+        for (suffix, ending) in noun_suffix_rules:
+            if noun.endswith(suffix):
+                base = noun[:len(noun) - len(suffix)] + ending
+                if base in lexicon:
+                    mask |= lexicon[base][0][0]
+    return tuple(ntype for ntype in NounType if mask & (1 << ntype.value))
+
+def wordnet_noun_types(noun: str) -> tuple[NounType, ...]:
+    '''Classifies a (lowercase) noun by walking its WordNet hypernyms'''
+    anchors = _noun_type_anchor_sets()
+    with wordnet_lock:
+        paths = [set(path) for s in wn.synsets(noun, wn.NOUN)
+                 for path in s.hypernym_paths()]
+    ntypes = []
+    for path in paths:
+        # Each hypernym path contributes at most one new type, checked in
+        # priority order.
+        for (ntype, anchor_set) in anchors:
+            if ntype not in ntypes and not anchor_set.isdisjoint(path):
+                ntypes.append(ntype)
+                break
+    return tuple(ntypes)
+
+@lru_cache(maxsize=NOUN_TYPE_CACHE_SIZE)
+def _classify_noun(noun: str) -> tuple[NounType, ...]:
+    '''Classifies a (lowercase) noun, preferring the prebuilt lexicon'''
+    lexicon = _noun_lexicon()
+    if lexicon is not None:
+        return _lexicon_noun_types(lexicon, noun)
+    return wordnet_noun_types(noun)
+
+def noun_type_cache_info():
+    '''Returns hit/miss statistics of the noun type classifier cache'''
+    return _classify_noun.cache_info()
+
+def clear_noun_type_cache() -> None:
+    '''Empties the noun type classifier cache'''
+    _classify_noun.cache_clear()
 
 #############
 # FUNCTIONS #
 #############
 
+@lru_cache(maxsize=1)
+def ensure_nltk_data() -> None:
+    '''Checks for required NLTK data offline, downloading only what is
+    missing'''
+    for (path, package) in nltk_resources:
+        try:
+            nltk.data.find(path)
+        except LookupError:
+            nltk.download(package, quiet=True)
+
+def load_models() -> None:
+    '''Loads NLTK data, WordNet and the SpaCy model up front, e.g. once per
+    worker process, so that no request waits for them'''
+    ensure_nltk_data()
+    with wordnet_lock:
+        wn.ensure_loaded()
+    nlp.model
+
+def intern_str(string: str | None):
+    "Intern a frequently repeated string (e.g. a unit), so copies share memory"
+    return sys.intern(string) if string else string
+
+def _compile_units():
+    "Compile all unit patterns into one alternation, one group per unit"
+    global _unit_re, _unit_names
+    _unit_names = [None, *unit_dict]
+    _unit_re = re.compile(r'\b(?:' + '|'.join(
+        f'({pattern})' for pattern in unit_dict.values()) + ')',
+        re.IGNORECASE)
+
+def add_unit(unit: str, pattern: str):
+    "Register another unit abbreviation pattern for standardize_units"
+    unit_dict[unit] = pattern
+    _compile_units()
+
 def standardize_units(string: str):
     "Un-abbreviate all cooking units in a given string"
-    for unit in unit_dict:
-        string = re.sub(unit_dict[unit], unit, string, flags=re.IGNORECASE)
-    return string
+    return _unit_re.sub(lambda m: _unit_names[m.lastindex], string)
 
 def str_to_fraction(data: str):
-    sum = Fraction()
-    table = str.maketrans({u'⁄': '/'})
-    data = unicodedata.normalize('NFKD', data).translate(table).split()
-    for val in data:
-        try:
-            f = Fraction(val)
-            if f.denominator > 1 and f.numerator > 10:
-                f = Fraction(f.numerator % 10 + \
-                    int(f.numerator / 10) * f.denominator, f.denominator)
-            sum += f
-        except:
-            continue
-    return sum
+    '''Parses the total quantity in a string, e.g. 1 1/2, as a Fraction'''
+    return parse_quantity(data)
 
 def fraction_to_str(frac: Fraction):
     if frac.denominator == 1:
@@ -262,3 +451,6 @@ def fraction_to_str(frac: Fraction):
                                       frac.denominator))])
     else:
         return str(frac)
+
+# Compile the unit patterns once, at import
+_compile_units()